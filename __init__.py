@@ -1,17 +1,55 @@
 # -*- coding: utf-8 -*-
 '''
 CISCO PACKAGE
+
+The package classes are imported from their modules on first access, so
+that a process that only analyses configurations (CiscoPyConfAsList) does
+not import pexpect or easysnmp (net-snmp and its MIBs).
 '''
 
-from ciscopy.ciscopyconf import CiscoPyConf
-from ciscopy.ciscopyconf import CiscoPyConfAsList
-from ciscopy.ciscopydevice import CiscoPyDevice
-from ciscopy.ciscopyinterface import CiscoPyInterface
-from ciscopy.ciscopynetwork import CiscoPyNetwork
-from ciscopy.ciscopysnmp import CiscoPySNMP
+import importlib
+
+# class name -> module that defines it
+_lazy_attributes = {
+    'CiscoPyConfArchive': 'ciscopy.ciscopyarchive',
+    'CiscoPyBlockExtractor': 'ciscopy.ciscopyblocks',
+    'CiscoPyConf': 'ciscopy.ciscopyconf',
+    'CiscoPyConfAsList': 'ciscopy.ciscopyconf',
+    'CiscoPyInterfaceExtractor': 'ciscopy.ciscopyconf',
+    'CiscoPyDevice': 'ciscopy.ciscopydevice',
+    'CiscoPyInterface': 'ciscopy.ciscopyinterface',
+    'CiscoPyInterfaceRecord': 'ciscopy.ciscopyinterface',
+    'CiscoPyInterfaceTable': 'ciscopy.ciscopyinterface',
+    'CiscoPyIPIndex': 'ciscopy.ciscopyipindex',
+    'CiscoPyNetwork': 'ciscopy.ciscopynetwork',
+    'CiscoPyPipeline': 'ciscopy.ciscopypipeline',
+    'CiscoPyCounterPoller': 'ciscopy.ciscopypoller',
+    'CiscoPyConfCorpus': 'ciscopy.ciscopysearch',
+    'CiscoPySNMP': 'ciscopy.ciscopysnmp',
+}
+
+__all__ = sorted(_lazy_attributes)
 
 __author__ = 'John Natschev'
 __maintainer__ = 'John Natschev'
 __email__ = 'jnatschev@optus.com.au'
 __status__ = 'Development'
 __version__ = '0.0.1'
+
+
+def __getattr__(name):
+    try:
+        module = _lazy_attributes[name]
+    except KeyError:
+        raise AttributeError(
+            'module {!r} has no attribute {!r}'.format(__name__, name))
+
+    value = getattr(importlib.import_module(module), name)
+    # cache the class so that __getattr__ is not called again
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
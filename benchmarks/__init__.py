@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+'''
+CISCOPY BENCHMARKS
+
+Synthetic configuration and SNMP data generators (generators) and the
+timing and memory benchmarks of the hot path methods (bench).
+
+Run the benchmarks and store the results of the current commit:
+    python -m ciscopy.benchmarks.bench
+
+Compare the results of two commits:
+    python -m ciscopy.benchmarks.bench --compare OLD.json NEW.json
+'''
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+'''
+The purpose of this module is to provide the timing and memory
+benchmarks of the ciscopy hot path methods.
+
+The import time and memory of the package and its subsystems are
+measured in a new python interpreter per repeat.
+
+Each other benchmark is run for every size, configuration lines or
+interfaces, and records the minimum and median elapsed time of a number
+of repeats and the peak memory allocated (tracemalloc) by one run. The
+results are written as json, named after the git commit, so that the results of
+different commits may be compared:
+
+    python -m ciscopy.benchmarks.bench [--sizes 1000 10000] [--repeat 5]
+    python -m ciscopy.benchmarks.bench --compare OLD.json NEW.json
+'''
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from ciscopy.benchmarks.generators import gen_config, gen_snmp_tables
+
+CONFIG_SIZES = (1000, 10000)
+INTERFACE_SIZES = (10, 500, 5000)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'results')
+
+_benchmarks = []
+
+
+def benchmark(kind):
+    '''
+    Register a benchmark. kind is 'config' or 'snmp', which decides
+    whether the benchmark setup function is called with a number of
+    configuration lines or a number of interfaces. The setup function
+    returns the function to be timed.
+    '''
+    def register(setup):
+        _benchmarks.append((setup.__name__, kind, setup))
+        return setup
+    return register
+
+
+def _conf(lines, paged=False):
+    from ciscopy.ciscopyconf import CiscoPyConf
+    cc = CiscoPyConf()
+    cc.get_cfgfromstring(gen_config(lines, paged=paged))
+    return cc
+
+
+def _device(interfaces):
+    from ciscopy.ciscopydevice import CiscoPyDevice
+    device = CiscoPyDevice()
+    device.cs = gen_snmp_tables(interfaces)
+    return device
+
+
+@benchmark('config')
+def sanitise(lines):
+    from ciscopy.ciscopyconf import CiscoPyConf
+    cc = CiscoPyConf()
+    l = cc._str2list(gen_config(lines))
+    return lambda: cc._sanitise(l)
+
+
+@benchmark('config')
+def sanitise_paged(lines):
+    from ciscopy.ciscopyconf import CiscoPyConf
+    cc = CiscoPyConf()
+    l = cc._str2list(gen_config(lines, paged=True))
+    return lambda: cc._sanitise(l)
+
+
+@benchmark('config')
+def include(lines):
+    cc = _conf(lines)
+    return lambda: cc.include(r'^ ip address \d')
+
+
+@benchmark('config')
+def exclude(lines):
+    cc = _conf(lines)
+    return lambda: cc.exclude(r'^ ')
+
+
+@benchmark('config')
+def section(lines):
+    cc = _conf(lines)
+    return lambda: cc.section(r'^router ospf')
+
+
+@benchmark('config')
+def cfg_blocks(lines):
+    cc = _conf(lines)
+    return lambda: cc.cfg_blocks(r'^ip access-list', r'^ deny ip any any')
+
+
+def _uncached(cc, query):
+    # Clear the interface records cached by get_interfacerecords, so that
+    # every run includes the extraction
+    def run():
+        cc._interface_records = None
+        return query(cc)
+    return run
+
+
+@benchmark('config')
+def get_sectioninterface(lines):
+    cc = _conf(lines)
+    return _uncached(cc, lambda cc: cc.get_sectioninterface)
+
+
+@benchmark('config')
+def get_waninterfaces(lines):
+    cc = _conf(lines)
+    return _uncached(cc, lambda cc: cc.get_waninterfaces)
+
+
+@benchmark('config')
+def get_waninterfaces_cached(lines):
+    cc = _conf(lines)
+    cc.get_interfacerecords
+    return lambda: cc.get_waninterfaces
+
+
+@benchmark('config')
+def get_interfaceswith(lines):
+    cc = _conf(lines)
+    return _uncached(cc,
+                     lambda cc: cc.get_interfaceswith(r'ip helper-address'))
+
+
+@benchmark('config')
+def get_interfaceswith_cached(lines):
+    cc = _conf(lines)
+    cc.get_interfacerecords
+    return lambda: cc.get_interfaceswith(r'ip helper-address')
+
+
+@benchmark('snmp')
+def wan_interfaces(interfaces):
+    device = _device(interfaces)
+    return lambda: device.wan_interfaces
+
+
+@benchmark('snmp')
+def obtac_node_interface(interfaces):
+    device = _device(interfaces)
+    return lambda: device.obtac_node_interface
+
+
+@benchmark('snmp')
+def interface_records(interfaces):
+    device = _device(interfaces)
+    return lambda: device.interface_records
+
+
+# Import benchmarks are run in a fresh interpreter. The statement is
+# timed after the interpreter has started, peak_bytes is the memory
+# allocated by the imports.
+IMPORT_BENCHMARKS = (
+    ('import_ciscopy', 'import ciscopy'),
+    ('import_conf', 'import ciscopy; ciscopy.CiscoPyConfAsList'),
+    ('import_device', 'import ciscopy; ciscopy.CiscoPyDevice'),
+    ('import_snmp', 'import ciscopy; ciscopy.CiscoPySNMP'),
+)
+
+_IMPORT_TIMER = (
+    'import json, time\n'
+    'start = time.perf_counter()\n'
+    '{}\n'
+    'print(json.dumps(time.perf_counter() - start))\n')
+
+_IMPORT_TRACER = (
+    'import json, tracemalloc\n'
+    'tracemalloc.start()\n'
+    '{}\n'
+    'print(json.dumps(tracemalloc.get_traced_memory()[1]))\n')
+
+
+def _run_import(timer, statement, env):
+    sp = subprocess.run([sys.executable, '-c', timer.format(statement)],
+                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                        universal_newlines=True, env=env)
+    if sp.returncode != 0:
+        return None
+    return json.loads(sp.stdout)
+
+
+def run_import_benchmark(statement, repeat):
+    '''Return a dict of the timing and peak memory of statement, run in
+    a new python interpreter, or None when the statement fails (for
+    example when easysnmp is not installed). As in run_benchmark the
+    timed runs are made without tracemalloc, the peak comes from one
+    further traced run.'''
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(package_dir)]
+        + [p for p in [env.get('PYTHONPATH')] if p])
+    times = []
+
+    for _ in range(repeat):
+        elapsed = _run_import(_IMPORT_TIMER, statement, env)
+        if elapsed is None:
+            return None
+        times.append(elapsed)
+
+    peak = _run_import(_IMPORT_TRACER, statement, env)
+    if peak is None:
+        return None
+
+    return {'min': min(times),
+            'median': statistics.median(times),
+            'repeat': repeat,
+            'peak_bytes': peak}
+
+
+def run_benchmark(func, repeat):
+    '''Return a dict of the timing and peak memory of func.'''
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'min': min(times),
+            'median': statistics.median(times),
+            'repeat': repeat,
+            'peak_bytes': peak}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(config_sizes=CONFIG_SIZES, interface_sizes=INTERFACE_SIZES,
+        repeat=5, names=None, out=sys.stdout):
+    '''
+    Run the registered benchmarks, or only those named in names, and
+    return the results as a dict.
+    '''
+    results = {}
+
+    for name, statement in IMPORT_BENCHMARKS:
+        if names and name not in names:
+            continue
+
+        result = run_import_benchmark(statement, repeat)
+        if result is None:
+            out.write('{:<40} failed: {}\n'.format(name, statement))
+            continue
+
+        results[name] = result
+        out.write('{:<40} {:>12.6f}s {:>12} bytes\n'.format(
+            name, result['median'], result['peak_bytes']))
+
+    for name, kind, setup in _benchmarks:
+        if names and name not in names:
+            continue
+
+        sizes = config_sizes if kind == 'config' else interface_sizes
+
+        for size in sizes:
+            key = '{}[{}]'.format(name, size)
+            results[key] = run_benchmark(setup(size), repeat)
+            results[key]['size'] = size
+            out.write('{:<40} {:>12.6f}s {:>12} bytes\n'.format(
+                key, results[key]['median'], results[key]['peak_bytes']))
+
+    return {'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results}
+
+
+def compare(old, new, out=sys.stdout):
+    '''Write the new/old ratio of the median time and peak memory of the
+    benchmarks in both result dicts.'''
+    out.write('{:<40} {:>10} {:>10}   ({} -> {})\n'.format(
+        'benchmark', 'time', 'memory', old['commit'], new['commit']))
+
+    for key, nr in new['results'].items():
+        if key not in old['results']:
+            continue
+        orr = old['results'][key]
+        out.write('{:<40} {:>9.2f}x {:>9.2f}x\n'.format(
+            key, nr['median'] / orr['median'] if orr['median'] else 0.0,
+            nr['peak_bytes'] / orr['peak_bytes'] if orr['peak_bytes'] else 0.0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ciscopy benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=CONFIG_SIZES,
+                        help='configuration lines, up to 1000000')
+    parser.add_argument('--interfaces', type=int, nargs='+',
+                        default=INTERFACE_SIZES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', help='benchmark names')
+    parser.add_argument('--output', help='results json file, default '
+                        'results/<commit>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            compare(json.load(f_old), json.load(f_new))
+        return
+
+    results = run(args.sizes, args.interfaces, args.repeat, args.only)
+    output = args.output or os.path.join(RESULTS_DIR,
+                                         results['commit'] + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    sys.stdout.write('results written to {}\n'.format(output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+'''
+The purpose of this module is to provide reproducible synthetic data for
+the benchmarks:
+    *   Cisco IOS type running-configs of a given number of lines, with or
+        without the paging (--More--) control characters of a captured
+        'show running-config'
+    *   SNMP walk tables of a device with a given number of interfaces, as
+        used by CiscoPyDevice
+
+The same seed always generates the same data.
+'''
+
+import random
+from ipaddress import IPv4Address
+
+# the paging prompt, and the backspaces that erase it, of a captured
+# 'show running-config' without 'terminal length 0'
+MORE_PROMPT = ' --More-- ' + '\x08' * 9 + ' ' * 9 + '\x08' * 9
+
+ROLES = (' WAN ', ' LAN ', ' WAP ', ' NETWORK ACCESS ', ' ')
+
+
+class SNMPVariable(object):
+    '''A stand in for easysnmp.variables.SNMPVariable.'''
+    __slots__ = ('oid', 'oid_index', 'value', 'snmp_type')
+
+    def __init__(self, oid, oid_index, value, snmp_type='OCTETSTR'):
+        self.oid = oid
+        self.oid_index = oid_index
+        self.value = value
+        self.snmp_type = snmp_type
+
+    def __repr__(self):
+        return '{}({}.{} = {})'.format(self.__class__.__name__, self.oid,
+                                       self.oid_index, self.value)
+
+
+class SNMPTables(object):
+    '''A stand in for a CiscoPySNMP object after get_cmdbdata and
+    get_counterdata.'''
+    def __repr__(self):
+        return '{}({} interfaces)'.format(self.__class__.__name__,
+                                          len(self.ifName))
+
+
+def _interface_block(rnd, n, vlan_base):
+    if rnd.random() < 0.5:
+        name = 'GigabitEthernet{}/{}'.format(n // 48, n % 48)
+    else:
+        name = 'Vlan{}'.format(vlan_base + n)
+
+    role = rnd.choice(ROLES)
+    lines = ['interface {}'.format(name),
+             ' description ***{}circuit is CCT{:06d} ***'.format(role, n)]
+
+    if name.startswith('Vlan') or role == ' WAN ':
+        ip = IPv4Address(0x0A000000 + n * 4 + 1)
+        lines.append(' ip address {} 255.255.255.252'.format(ip))
+        if rnd.random() < 0.2:
+            lines.append(' ip helper-address 10.255.0.{}'.format(n % 250 + 1))
+        lines.append(' no ip redirects')
+    else:
+        if rnd.random() < 0.5:
+            lines.append(' switchport mode access')
+            lines.append(' switchport access vlan {}'.format(n % 4000 + 1))
+            lines.append(' spanning-tree portfast')
+        else:
+            lines.append(' switchport mode trunk')
+            lines.append(' switchport trunk allowed vlan 1,{}-{}'.format(
+                n % 100 + 2, n % 100 + 20))
+
+    if rnd.random() < 0.1:
+        lines.append(' shutdown')
+
+    lines.append('!')
+
+    return lines
+
+
+def _router_block(rnd, n):
+    lines = ['router ospf {}'.format(n + 1),
+             ' log-adjacency-changes']
+    lines.extend(' network 10.{}.{}.0 0.0.0.255 area 0'.format(n % 256, i)
+                 for i in range(rnd.randint(2, 8)))
+    lines.append('!')
+
+    return lines
+
+
+def _acl_block(rnd, n):
+    lines = ['ip access-list extended ACL-{}'.format(n)]
+    lines.extend(' permit tcp any host 10.{}.{}.{} eq {}'.format(
+        n % 256, i, rnd.randint(1, 254), rnd.choice((22, 80, 161, 443)))
+        for i in range(rnd.randint(3, 12)))
+    lines.append(' deny ip any any log')
+    lines.append('!')
+
+    return lines
+
+
+def gen_config(lines=1000, seed=0, paged=False):
+    '''
+    Return a str of a synthetic running-config of approximately lines
+    lines, as captured by 'show running-config'. When paged is True a
+    --More-- paging prompt is included every 24 lines.
+    '''
+    rnd = random.Random(seed)
+    rl = ['show running-config',
+          'Building configuration...',
+          '',
+          'Current configuration : 123456 bytes',
+          '!',
+          'version 15.2',
+          'service timestamps debug datetime msec',
+          'service password-encryption',
+          '!',
+          'hostname BENCH-{:04d}'.format(seed),
+          '!',
+          'banner login ^C',
+          'Authorised access only',
+          '^C',
+          '!']
+    footer = ['snmp-server community s3cr3t RW snmp-access',
+              'snmp-server community public RO 99',
+              '!',
+              'line vty 0 4',
+              ' transport input ssh',
+              '!',
+              'end']
+    n = 0
+
+    while len(rl) + len(footer) < lines:
+        kind = rnd.random()
+        if kind < 0.7:
+            rl.extend(_interface_block(rnd, n, 100))
+        elif kind < 0.85:
+            rl.extend(_router_block(rnd, n))
+        else:
+            rl.extend(_acl_block(rnd, n))
+        n += 1
+
+    rl.extend(footer)
+
+    if paged:
+        paged_rl = []
+        for i, v in enumerate(rl):
+            if i and i % 24 == 0:
+                paged_rl.append(MORE_PROMPT + v)
+            else:
+                paged_rl.append(v)
+        rl = paged_rl
+
+    return '\r\n'.join(rl) + '\r\n'
+
+
+def gen_snmp_tables(interfaces=100, seed=0):
+    '''
+    Return an SNMPTables object of a device with interfaces interfaces,
+    with the attributes retrieved by CiscoPySNMP.get_cmdbdata (and the
+    counters of CiscoPySNMP.get_counterdata).
+
+    The first interface is the OB TAC node interface, about a tenth of
+    the interfaces are OVPI polled WAN interfaces and about half of the
+    interfaces have an ip address.
+    '''
+    rnd = random.Random(seed)
+    t = SNMPTables()
+    t.sysName = SNMPVariable('.1.3.6.1.2.1.1.5', '0',
+                             'BENCH-{:04d}'.format(seed))
+    t.entLogicalType = [SNMPVariable('.1.3.6.1.2.1.47.1.2.1.1.3', '1',
+                                     '.1.3.6.1.2.1', 'OBJECTID')]
+    t.ifAlias = []
+    t.ifName = []
+    t.ifDescr = []
+    t.ifSpeed = []
+    t.ifHighSpeed = []
+    t.ifHCInOctets = []
+    t.ifHCOutOctets = []
+    t.ifInErrors = []
+    t.ipAdEntIfIndex = []
+    t.ipAdEntAddr = []
+    t.ipAdEntNetMask = []
+
+    for i in range(interfaces):
+        oid_index = str(i + 1)
+        name = 'Gi{}/{}'.format(i // 48, i % 48)
+
+        if i == 0:
+            alias = '*N** NODE INTERFACE'
+        elif rnd.random() < 0.1:
+            alias = '*** OVPI_POLL circuit is CCT{:06d} ***'.format(i)
+        else:
+            alias = 'user port {}'.format(i)
+
+        t.ifAlias.append(SNMPVariable('.1.3.6.1.2.1.31.1.1.1.18',
+                                      oid_index, alias))
+        t.ifName.append(SNMPVariable('.1.3.6.1.2.1.31.1.1.1.1', oid_index,
+                                     name))
+        t.ifDescr.append(SNMPVariable('.1.3.6.1.2.1.2.2.1.2', oid_index,
+                                      name.replace('Gi', 'GigabitEthernet')))
+        t.ifSpeed.append(SNMPVariable('.1.3.6.1.2.1.2.2.1.5', oid_index,
+                                      '1000000000', 'GAUGE'))
+        t.ifHighSpeed.append(SNMPVariable('.1.3.6.1.2.1.31.1.1.1.15',
+                                          oid_index, '1000', 'GAUGE'))
+        t.ifHCInOctets.append(SNMPVariable(
+            '.1.3.6.1.2.1.31.1.1.1.6', oid_index,
+            str(rnd.randint(0, 2 ** 40)), 'COUNTER64'))
+        t.ifHCOutOctets.append(SNMPVariable(
+            '.1.3.6.1.2.1.31.1.1.1.10', oid_index,
+            str(rnd.randint(0, 2 ** 40)), 'COUNTER64'))
+        t.ifInErrors.append(SNMPVariable('.1.3.6.1.2.1.2.2.1.14', oid_index,
+                                         str(rnd.randint(0, 1000)),
+                                         'COUNTER'))
+
+        if i == 0 or rnd.random() < 0.5:
+            ip = str(IPv4Address(0x0A000000 + i * 4 + 1))
+            t.ipAdEntIfIndex.append(SNMPVariable('.1.3.6.1.2.1.4.20.1.2',
+                                                 ip, oid_index, 'INTEGER'))
+            t.ipAdEntAddr.append(SNMPVariable('.1.3.6.1.2.1.4.20.1.1', ip,
+                                              ip, 'IPADDR'))
+            t.ipAdEntNetMask.append(SNMPVariable('.1.3.6.1.2.1.4.20.1.3',
+                                                 ip, '255.255.255.252',
+                                                 'IPADDR'))
+
+    return t
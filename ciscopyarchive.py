@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+'''
+The purpose of this module is to provide a deduplicated archive of
+configuration snapshots, for example the daily running-config of every
+device in the fleet.
+
+A configuration is split into sections, keyed by their content and never
+by their position, so that a change to one part of a configuration does
+not change the keys of the other parts:
+    *   a top level line with indented lines below it (interface, router,
+        line etc) is a section keyed by the line. An indented line that
+        has indented lines below it (address-family, class of a
+        policy-map etc) is split into its own section, keyed by the key of
+        its parent and the line (router bgp 65000 > address-family ...).
+        The lines that follow a nested block, such as exit-address-family,
+        belong to the section of the nested block.
+    *   consecutive top level lines without indented lines that start with
+        the same words (ip route ..., snmp-server community ...) are a
+        section keyed by those words.
+Each section is stored once, zlib compressed, named by the sha256 hash of
+its content. A snapshot is a manifest of the section keys and hashes of a
+device on a date.
+
+Archive layout:
+    <root>/objects/<2 hex>/<62 hex>         compressed section content
+    <root>/manifests/<device>/<date>.json   snapshot manifest
+
+Questions about the history of a section, such as when it changed, are
+answered from the manifests alone without reading any section content.
+'''
+
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from functools import lru_cache
+from ciscopy.ciscopyconf import CiscoPyConfAsList
+
+
+def _indent(le):
+    return len(le) - len(le.lstrip())
+
+
+def _nodes(l):
+    # Return a list of (line, lines) of the list l, each line of l with
+    # the more indented lines below it
+    nodes = []
+
+    for le in l:
+        if nodes and _indent(le) > _indent(nodes[-1][0]):
+            nodes[-1][1].append(le)
+        else:
+            nodes.append((le, []))
+
+    return nodes
+
+
+def _group_key(le):
+    # The first two words of a line with more than two words, otherwise
+    # the first word: ip route, snmp-server community, hostname etc
+    words = le.split()
+
+    if len(words) > 2:
+        return ' '.join(words[:2])
+
+    return words[0] if words else ''
+
+
+def _split_block(key, header, l, sections):
+    # Append the sections of the block of line header, with the indented
+    # lines l, to sections. The header and the lines without indented
+    # lines below them are one section, each nested block is split into
+    # its own section. Lines that follow a nested block, such as
+    # exit-address-family, are appended to the last section of the
+    # nested block.
+    sections.append((key, [header]))
+
+    for le, sub in _nodes(l):
+        if sub:
+            _split_block('{} > {}'.format(key, le.strip()), le, sub, sections)
+        else:
+            sections[-1][1].append(le)
+
+
+def split_sections(l):
+    '''
+    Return a list of (key, lines) sections of the configuration list l,
+    refer to the module documentation for the keys. Joining the lines of
+    the sections, in order, gives l.
+
+    A key that occurs more than once, for example ip route lines that are
+    not consecutive, is followed by the first line of the section in
+    brackets, and then by #2, #3 etc if that is not unique either.
+    '''
+    sections = []
+    group_key = None
+
+    for le, sub in _nodes(l):
+        if sub:
+            _split_block(le, le, sub, sections)
+            group_key = None
+            continue
+
+        key = _group_key(le)
+
+        if key == group_key:
+            sections[-1][1].append(le)
+        else:
+            sections.append((key, [le]))
+            group_key = key
+
+    rl = []
+    seen = set()
+
+    for key, lines in sections:
+        if key in seen:
+            key = '{} [{}]'.format(key, lines[0].strip())
+
+        unique = key
+        n = 1
+        while unique in seen:
+            n += 1
+            unique = '{}#{}'.format(key, n)
+
+        seen.add(unique)
+        rl.append((unique, lines))
+
+    return rl
+
+
+class CiscoPyConfArchive(object):
+    '''
+    A deduplicated archive of configuration snapshots stored in the
+    directory root. Refer to the module documentation for the layout.
+
+    Dates are str, normally ISO format dates (YYYY-MM-DD) so that they
+    sort in date order.
+    '''
+    def __init__(self, root, compresslevel=6):
+        self.root = root
+        self.compresslevel = compresslevel
+        self.objects_dir = os.path.join(root, 'objects')
+        self.manifests_dir = os.path.join(root, 'manifests')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        # the content of a section never changes, cache it for rebuilds
+        self._read_object = lru_cache(maxsize=65536)(self._read_object)
+
+    def _write_file(self, path, data):
+        # write to a temporary file then rename, so that a reader never
+        # sees a partially written file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def _object_path(self, h):
+        return os.path.join(self.objects_dir, h[:2], h[2:])
+
+    def _device_dir(self, device):
+        if os.sep in device or device.startswith('.'):
+            raise ValueError('invalid device name: {}'.format(device))
+        return os.path.join(self.manifests_dir, device)
+
+    def _manifest_path(self, device, date):
+        if os.sep in date or date.startswith('.'):
+            raise ValueError('invalid date: {}'.format(date))
+        return os.path.join(self._device_dir(device), date + '.json')
+
+    def _write_object(self, lines):
+        data = '\n'.join(lines).encode('utf-8')
+        h = hashlib.sha256(data).hexdigest()
+        path = self._object_path(h)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_file(path, zlib.compress(data, self.compresslevel))
+
+        return h
+
+    def _read_object(self, h):
+        with open(self._object_path(h), 'rb') as f:
+            return tuple(zlib.decompress(f.read()).decode('utf-8').split('\n'))
+
+    def snapshot(self, device, cc, date=None):
+        '''
+        Store the configuration cc, a CiscoPyConfAsList, of device for
+        date (default today). Only sections not already in the archive are
+        stored. Returns the manifest, a dict of device, date and sections,
+        a list of [key, hash].
+        '''
+        if date is None:
+            date = datetime.date.today().isoformat()
+
+        manifest = {'device': device,
+                    'date': date,
+                    'sections': [[key, self._write_object(lines)]
+                                 for key, lines in split_sections(cc)]}
+        path = self._manifest_path(device, date)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_file(path, json.dumps(manifest).encode('utf-8'))
+
+        return manifest
+
+    @property
+    def devices(self):
+        return sorted(os.listdir(self.manifests_dir))
+
+    def dates(self, device):
+        '''Return the sorted snapshot dates of device.'''
+        try:
+            names = os.listdir(self._device_dir(device))
+        except FileNotFoundError:
+            return []
+
+        return sorted(n[:-len('.json')] for n in names if n.endswith('.json'))
+
+    def manifest(self, device, date):
+        with open(self._manifest_path(device, date)) as f:
+            return json.load(f)
+
+    def section(self, h):
+        '''Return the section stored as hash h.'''
+        return CiscoPyConfAsList(self._read_object(h))
+
+    def rebuild(self, device, date=None):
+        '''Return the configuration of device on date, default the latest
+        snapshot, as a CiscoPyConfAsList. Raises FileNotFoundError when
+        there is no such snapshot.'''
+        if date is None:
+            dates = self.dates(device)
+            if not dates:
+                raise FileNotFoundError(
+                    'no snapshots of device: {}'.format(device))
+            date = dates[-1]
+
+        rl = CiscoPyConfAsList()
+
+        for _, h in self.manifest(device, date)['sections']:
+            rl.extend(self._read_object(h))
+
+        return rl
+
+    def section_history(self, device, key):
+        '''
+        Return a list of (date, hash) of every snapshot of device in which
+        the section key changed, was added (the first entry) or was removed
+        (hash None).
+        '''
+        rl = []
+        previous = None
+
+        for date in self.dates(device):
+            h = dict(self.manifest(device, date)['sections']).get(key)
+            if h != previous:
+                rl.append((date, h))
+                previous = h
+
+        return rl
+
+    def diff(self, device, date_a, date_b):
+        '''
+        Return a dict of the section keys added, removed and changed
+        between the snapshots of device on date_a and date_b.
+        '''
+        a = dict(self.manifest(device, date_a)['sections'])
+        b = dict(self.manifest(device, date_b)['sections'])
+
+        return {'added': [k for k in b if k not in a],
+                'removed': [k for k in a if k not in b],
+                'changed': [k for k in b if k in a and a[k] != b[k]]}
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, self.root)
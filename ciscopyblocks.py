@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+'''
+The purpose of this module is to provide the extraction of blocks of
+lines, delimited by a start and an end regular expression, from
+configurations and from large 'show' command outputs (route tables,
+'show tech' captures etc).
+
+Start and end lines are paired in a single forward pass, each line is
+evaluated once against each regular expression. A block is the lines from
+a start line up to and including the paired end line, which must come
+after the start line.
+
+Three pairing policies are supported:
+    overlap:    every start line is paired with the first end line after
+                it, so blocks may overlap. This is the behaviour of
+                CiscoPyConfAsList.cfg_blocks.
+    nested:     an end line is paired with the most recent unpaired start
+                line, so blocks nest like brackets.
+    first:      start lines within an unpaired block are ignored, so
+                blocks do not overlap.
+
+Start lines without an end line are not blocks.
+'''
+
+from ciscopy.ciscopyconf import CiscoPyConfAsList
+from ciscopy.ciscopyprofile import compile_rx
+
+POLICIES = ('overlap', 'nested', 'first')
+
+
+class CiscoPyBlockView(object):
+    '''
+    A read only view of the lines source[start:stop] that does not copy
+    the lines. The view is invalid once the source list is modified, use
+    tolist to keep a copy.
+    '''
+    __slots__ = ('source', 'start', 'stop')
+
+    def __init__(self, source, start, stop):
+        self.source = source
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.source[self.start + j]
+                    for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('block view index out of range')
+
+        return self.source[self.start + i]
+
+    def __iter__(self):
+        source = self.source
+        for i in range(self.start, self.stop):
+            yield source[i]
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(
+                a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def tolist(self):
+        return CiscoPyConfAsList(self.source[self.start:self.stop])
+
+    @property
+    def cfg_asstring(self):
+        return '\n'.join(self)
+
+    def __repr__(self):
+        return '{}({}:{})'.format(self.__class__.__name__, self.start,
+                                  self.stop)
+
+
+class CiscoPyBlockExtractor(object):
+    '''
+    Extract the blocks of lines that start with a line matching
+    start_block_rx and end with a line matching end_block_rx, refer to
+    the module documentation for the pairing policies.
+    '''
+    def __init__(self, start_block_rx, end_block_rx, policy='overlap'):
+        if policy not in POLICIES:
+            raise ValueError('unknown block policy: {}'.format(policy))
+
+        self.start_block_rx = start_block_rx
+        self.end_block_rx = end_block_rx
+        self.policy = policy
+        self._start_crx = compile_rx(start_block_rx)
+        self._end_crx = compile_rx(end_block_rx)
+
+    def _pair(self, i, le, opened):
+        # Update the list of open start indicies with line i and return a
+        # list of the (start, stop) pairs that it closes. An end line is
+        # considered before a start line so that a line matching both
+        # only closes blocks that started before it.
+        closed = []
+
+        if opened and self._end_crx.search(le):
+            if self.policy == 'nested':
+                closed.append((opened.pop(), i + 1))
+            else:
+                closed.extend((start, i + 1) for start in opened)
+                del opened[:]
+
+        if self._start_crx.search(le):
+            if self.policy != 'first' or not opened:
+                opened.append(i)
+
+        return closed
+
+    def pairs(self, lines):
+        '''
+        Yield (start, stop) of every block of the sequence lines, such that
+        lines[start:stop] is the block, in the order the blocks end.
+        '''
+        opened = []
+
+        for i, le in enumerate(lines):
+            for pair in self._pair(i, le, opened):
+                yield pair
+
+    def blocks(self, lines):
+        '''Yield a CiscoPyBlockView of every block of the sequence lines,
+        in the order the blocks end.'''
+        for start, stop in self.pairs(lines):
+            yield CiscoPyBlockView(lines, start, stop)
+
+    def stream(self, lines):
+        '''
+        Yield a CiscoPyConfAsList of every block of the iterable lines,
+        in the order the blocks end, without reading all of the lines
+        first. lines may be an open file, or a pexpect spawn object
+        producing a 'show' command output, or any other iterable of str.
+
+        Trailing line boundary characters are removed. Only the lines from
+        the earliest open block onwards are kept in memory.
+        '''
+        opened = []
+        buffered = []
+        offset = 0
+
+        for i, le in enumerate(lines):
+            le = le.rstrip('\r\n')
+
+            if not opened:
+                del buffered[:]
+                offset = i
+
+            buffered.append(le)
+
+            for start, stop in self._pair(i, le, opened):
+                yield CiscoPyConfAsList(buffered[start - offset:stop - offset])
+
+            # drop the buffered lines before the earliest open block
+            if opened and offset < opened[0]:
+                del buffered[:opened[0] - offset]
+                offset = opened[0]
+
+    def __repr__(self):
+        return '{}({!r}, {!r}, policy={!r})'.format(
+            self.__class__.__name__, self.start_block_rx, self.end_block_rx,
+            self.policy)
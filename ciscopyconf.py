@@ -5,7 +5,10 @@ object via inheritance.'''
 
 import re
 import os
-import pexpect
+import csv
+import json
+from ipaddress import ip_interface
+from ciscopy.ciscopyprofile import compile_rx, profiled
 
 class CiscoPyPxRxs(object):
     '''
@@ -16,6 +19,8 @@ class CiscoPyPxRxs(object):
     process.
     '''
     def __init__(self, pxobj):
+        import pexpect
+
         self.passwd_prompt = '(?i)password'
         self.exec_prompt = r'[\x21-\x7E]{2,}>$'
         self.priv_exec_prompt = r'[\x21-\x7E]{2,}#$'
@@ -42,12 +47,245 @@ class CiscoPyPxRxs(object):
         self.px_cvrfymd5list = pxobj.compile_pattern_list(self.px_verify_md5_list)
         self.px_ccpcmdlist = pxobj.compile_pattern_list(self.px_copy_command_list)
 
+class CiscoPyConfInterface(object):
+    '''
+    An interface extracted from a configuration by
+    CiscoPyInterfaceExtractor.
+
+    roles is a tuple of the role tags ('access', 'wan', 'lan', 'wap')
+    found in the interface section. ip_address is an
+    ipaddress.IPv4Interface, secondary ip addresses are listed in
+    secondary_ip_addresses. vlans is a tuple of the access vlan or the
+    trunk allowed vlans. attributes is a dict of the registered
+    attribute patterns that matched. start and stop are the list
+    indicies of the interface section in the configuration.
+    '''
+    __slots__ = ('name', 'description', 'roles', 'ip_address',
+                 'secondary_ip_addresses', 'shutdown', 'switchport_mode',
+                 'vlans', 'attributes', 'start', 'stop')
+
+    fields = ('name', 'description', 'role', 'ip_address', 'ip_netmask',
+              'shutdown', 'switchport_mode', 'vlans')
+
+    def __init__(self, name, start):
+        self.name = name
+        self.description = None
+        self.roles = ()
+        self.ip_address = None
+        self.secondary_ip_addresses = ()
+        self.shutdown = False
+        self.switchport_mode = None
+        self.vlans = ()
+        self.attributes = dict()
+        self.start = start
+        self.stop = start + 1
+
+    @property
+    def role(self):
+        return self.roles[0] if self.roles else None
+
+    def as_dict(self):
+        '''Return the interface as a dict of str, int and bool values,
+        suitable for csv or json export.'''
+        d = {'name': self.name,
+             'description': self.description,
+             'role': self.role,
+             'ip_address': None,
+             'ip_netmask': None,
+             'shutdown': self.shutdown,
+             'switchport_mode': self.switchport_mode,
+             'vlans': ','.join(str(v) for v in self.vlans)}
+
+        if self.ip_address is not None:
+            d['ip_address'] = str(self.ip_address.ip)
+            d['ip_netmask'] = str(self.ip_address.netmask)
+
+        d.update(self.attributes)
+
+        return d
+
+    def __repr__(self):
+        return '{}({}, role={})'.format(self.__class__.__name__, self.name,
+                                        self.role)
+
+
+class CiscoPyInterfaceExtractor(object):
+    '''
+    Extract every interface of a configuration in a single pass over the
+    configuration lines.
+
+    Role tags are the strings that identify the OB interface roles in an
+    interface section, for example in the description:
+        access: ' NETWORK ACCESS'
+        wan:    ' WAN '
+        lan:    ' LAN '
+        wap:    ' WAP '
+
+    Additional attributes are extracted by registering a regular
+    expression with register_attribute. The attribute value is the first
+    group of the first matching line of an interface section, or the
+    stripped line when the regular expression has no groups.
+    '''
+    role_tags = (('access', ' NETWORK ACCESS'),
+                 ('wan', ' WAN '),
+                 ('lan', ' LAN '),
+                 ('wap', ' WAP '))
+
+    def __init__(self):
+        self.attribute_patterns = list()
+
+    def register_attribute(self, name, rx):
+        self.attribute_patterns.append((name, re.compile(rx)))
+
+    def _parse_vlans(self, s):
+        vlans = list()
+
+        for v in s.split(','):
+            if '-' in v:
+                first, last = v.split('-', 1)
+                vlans.extend(range(int(first), int(last) + 1))
+            elif v.isdigit():
+                vlans.append(int(v))
+
+        return vlans
+
+    def _parse_line(self, interface, le, roles):
+        for role, tag in self.role_tags:
+            if tag in le and role not in roles:
+                roles.append(role)
+
+        if len(interface.attributes) < len(self.attribute_patterns):
+            for name, crx in self.attribute_patterns:
+                if name not in interface.attributes:
+                    m = crx.search(le)
+                    if m:
+                        interface.attributes[name] = (m.group(1) if crx.groups
+                                                      else le.strip())
+
+        values = le.split()
+
+        if not values:
+            return
+        elif values[0] == 'description':
+            interface.description = le.strip()[len('description '):]
+        elif values[0] == 'shutdown':
+            interface.shutdown = True
+        elif values[:2] == ['ip', 'address'] and len(values) >= 4:
+            try:
+                ipint = ip_interface('/'.join(values[2:4]))
+            except ValueError:
+                return
+            if values[-1] == 'secondary':
+                interface.secondary_ip_addresses += (ipint,)
+            else:
+                interface.ip_address = ipint
+        elif values[0] == 'switchport' and len(values) >= 3:
+            if values[1] == 'mode':
+                interface.switchport_mode = values[2]
+            elif values[1:3] == ['access', 'vlan'] and len(values) == 4:
+                interface.vlans = tuple(self._parse_vlans(values[3]))
+            elif values[1:4] == ['trunk', 'allowed', 'vlan']:
+                if values[4:5] == ['add']:
+                    interface.vlans += tuple(self._parse_vlans(values[5]))
+                elif values[4:5] == ['remove']:
+                    removed = set(self._parse_vlans(values[5]))
+                    interface.vlans = tuple(v for v in interface.vlans
+                                            if v not in removed)
+                elif len(values) == 5:
+                    interface.vlans = tuple(self._parse_vlans(values[4]))
+
+    def extract(self, l):
+        '''
+        Return a list of CiscoPyConfInterface, one per interface section
+        of the configuration list l. An interface section starts with a
+        line beginning with 'interface' and includes the indented lines
+        that follow it.
+        '''
+        rl = []
+        interface = None
+        roles = None
+
+        for i, v in enumerate(l):
+            if v.startswith('interface'):
+                if interface is not None:
+                    interface.roles = tuple(roles)
+                interface = CiscoPyConfInterface(v.split()[-1], i)
+                roles = []
+                rl.append(interface)
+            elif interface is None:
+                continue
+            elif v[:1].isspace():
+                interface.stop = i + 1
+            else:
+                interface.roles = tuple(roles)
+                interface = None
+                continue
+
+            self._parse_line(interface, v, roles)
+
+        if interface is not None:
+            interface.roles = tuple(roles)
+
+        return rl
+
+
 class CiscoPyConfAsList(list):
     def __init__(self, l=[]):
+        self._interface_records = None
         self.extend(l)
         self.start_block_rx = None
         self.end_block_rx = None
     
+    # The list methods that modify the configuration clear the interface
+    # records cached by get_interfacerecords
+    def append(self, le):
+        self._interface_records = None
+        super().append(le)
+
+    def extend(self, l):
+        self._interface_records = None
+        super().extend(l)
+
+    def insert(self, i, le):
+        self._interface_records = None
+        super().insert(i, le)
+
+    def pop(self, i=-1):
+        self._interface_records = None
+        return super().pop(i)
+
+    def remove(self, le):
+        self._interface_records = None
+        super().remove(le)
+
+    def clear(self):
+        self._interface_records = None
+        super().clear()
+
+    def sort(self, *args, **kwargs):
+        self._interface_records = None
+        super().sort(*args, **kwargs)
+
+    def reverse(self):
+        self._interface_records = None
+        super().reverse()
+
+    def __setitem__(self, i, le):
+        self._interface_records = None
+        super().__setitem__(i, le)
+
+    def __delitem__(self, i):
+        self._interface_records = None
+        super().__delitem__(i)
+
+    def __iadd__(self, l):
+        self._interface_records = None
+        return super().__iadd__(l)
+
+    def __imul__(self, n):
+        self._interface_records = None
+        return super().__imul__(n)
+
     def __str__(self):
         # provide a string representation of the list
         return self.cfg_asstring
@@ -80,25 +318,41 @@ class CiscoPyConfAsList(list):
     def _get_indicies(self, rx):
         return [i for i, v in enumerate(self) if re.search(rx, v)]
 
-    def cfg_asgenerator(self):
+    def cfg_asgenerator(self, start_block_rx=None, end_block_rx=None):
         # Returns parts of the list (self) of configuration lines, either line
-        # by line, or by blocks
-        if self.start_block_rx and self.end_block_rx:
-            start_block_idxs = self._get_indicies(self.start_block_rx)
-            end_block_idxs = self._get_indicies(self.end_block_rx)
-            for sbi in start_block_idxs:
-                rl = CiscoPyConfAsList()
-                ebi = [v for v in end_block_idxs if v > sbi][0] + 1
-                rl.extend(self[sbi:ebi])
-                yield rl
+        # by line, or by blocks. The block regular expressions default to
+        # the start_block_rx and end_block_rx attributes.
+        from ciscopy.ciscopyblocks import CiscoPyBlockExtractor
+
+        start_block_rx = start_block_rx or self.start_block_rx
+        end_block_rx = end_block_rx or self.end_block_rx
+
+        if start_block_rx and end_block_rx:
+            extractor = CiscoPyBlockExtractor(start_block_rx, end_block_rx)
+            for sbi, ebi in extractor.pairs(self):
+                yield CiscoPyConfAsList(self[sbi:ebi])
         else:
             for le in self:
                 yield le
+
+    def iter_blocks(self, start_block_rx, end_block_rx, policy='overlap'):
+        '''
+        Yield a CiscoPyBlockView, a view that does not copy the lines, of
+        every block that starts with a line matching start_block_rx and
+        ends with a line matching end_block_rx. Refer to the ciscopyblocks
+        module for the pairing policies: overlap, nested and first.
+        '''
+        from ciscopy.ciscopyblocks import CiscoPyBlockExtractor
+
+        extractor = CiscoPyBlockExtractor(start_block_rx, end_block_rx,
+                                          policy=policy)
+        return extractor.blocks(self)
     
     @property
     def cfg_asstring(self):
         return '\n'.join(self)
 
+    @profiled()
     def begin(self, rx):
         '''
         The begin method is equivalent to the Cisco IOS pipe (|) through
@@ -107,12 +361,15 @@ class CiscoPyConfAsList(list):
         One 'begin' alias is included for convenience:
             b:  shorthand for begin
         '''
+        crx = compile_rx(rx)
+
         for i, v in enumerate(self):
-            if re.search(rx, v):
+            if crx.search(v):
                 return CiscoPyConfAsList([le for le in self[i:]])
 
     b = begin
 
+    @profiled()
     def include(self, rx):
         '''
         The include method is equivalent to the Cisco IOS pipe through (|)
@@ -122,10 +379,12 @@ class CiscoPyConfAsList(list):
             i:  shorthand for include
         '''
         # Simulates Cisco IOS show ... | include RegularExpression
-        return CiscoPyConfAsList([v for v in self if re.search(rx, v)])
+        crx = compile_rx(rx)
+        return CiscoPyConfAsList([v for v in self if crx.search(v)])
     
     i = include
 
+    @profiled()
     def exclude(self, rx):
         '''
         The exclude method is eqivalent to the Cisco IOS pipe through (|)
@@ -136,26 +395,26 @@ class CiscoPyConfAsList(list):
         '''
         # Simulates Cisco IOS show | exclude string
         # Also has the option of excluding based on rx e
-        return CiscoPyConfAsList([v for v in self if not re.search(rx, v)])
+        crx = compile_rx(rx)
+        return CiscoPyConfAsList([v for v in self if not crx.search(v)])
 
     e = exclude
 
+    @profiled()
     def cfg_blocks(self, start_block_rx, end_block_rx):
-        self.start_block_rx = start_block_rx
-        self.end_block_rx = end_block_rx
-
         rl = CiscoPyConfAsList()
-        rl.start_block_rx = self.start_block_rx
-        rl.end_block_rx = self.end_block_rx
+        rl.start_block_rx = start_block_rx
+        rl.end_block_rx = end_block_rx
 
-        for le in self.cfg_asgenerator():
+        for le in self.cfg_asgenerator(start_block_rx, end_block_rx):
             rl.extend(le)
         
         return rl
 
     def sections(self, rx):
             # Generate indexes for lines that match the regex
-            list_indicies = [i for i, v in enumerate(self) if re.search(rx, v)]
+            crx = compile_rx(rx)
+            list_indicies = [i for i, v in enumerate(self) if crx.search(v)]
 
             # Iterate through the idxs list that may be modified after each
             # index.  This tries to ensure that nested regex matches do not
@@ -171,6 +430,7 @@ class CiscoPyConfAsList(list):
                 list_indicies = [i for i in list_indicies
                                  if i >= current_index + len(l)]
 
+    @profiled()
     def section(self, rx):
         '''
         The section method is eqivalent to the Cisco IOS pipe through (|)
@@ -189,24 +449,29 @@ class CiscoPyConfAsList(list):
     
     s = section
     
+    @profiled()
     def has_regexp(self, rx):
         r = False
+        crx = compile_rx(rx)
         
         for v in self:
-            if re.search(rx, v):
+            if crx.search(v):
                 r = True
         
         return r
     
+    @profiled()
     def has_noregexp(self, rx):
         r = True
+        crx = compile_rx(rx)
         
         for v in self:
-            if re.search(rx, v):
+            if crx.search(v):
                 r = False
         
         return r
     
+    @profiled()
     def has_string(self, s):
         r = False
         
@@ -216,48 +481,81 @@ class CiscoPyConfAsList(list):
         
         return r
     
+    @property
+    @profiled()
+    def get_interfacerecords(self):
+        '''
+        Return a list of CiscoPyConfInterface, one per interface section,
+        extracted in a single pass over the configuration. The records are
+        cached until the configuration is modified, so the role helpers
+        and get_interfaceswith share one pass. The list is a copy, the
+        records are the cached objects and must not be modified.
+        '''
+        if getattr(self, '_interface_records', None) is None:
+            self._interface_records = CiscoPyInterfaceExtractor().extract(self)
+
+        return list(self._interface_records)
+
     @property
     def get_sectioninterface(self):
-        rl = []
-        interfaces = self.section(r'^interface')
-        interface_indicies = []
-        
-        for i, v in enumerate(interfaces):
-            if v.startswith('interface'):
-                interface_indicies.append(i)
-        
-        for i, v in enumerate(interface_indicies):
-            try:
-                rl.append(CiscoPyConfAsList(interfaces[v:interface_indicies[i+1]]))
-            except IndexError:
-                rl.append(CiscoPyConfAsList(interfaces[v:]))
-        
-        return rl
+        return [CiscoPyConfAsList(self[r.start:r.stop])
+                for r in self.get_interfacerecords]
+
+    @profiled()
+    def get_interfacesbyrole(self, role):
+        return [r.name for r in self.get_interfacerecords if role in r.roles]
 
     @property
     def get_accessinterfaces(self):
-        rl = [lv[0].split()[-1] for lv in self.get_sectioninterface if lv.has_string(' NETWORK ACCESS')]
-        
-        return rl
+        return self.get_interfacesbyrole('access')
     
     @property
     def get_waninterfaces(self):
-        rl = [lv[0].split()[-1] for lv in self.get_sectioninterface if lv.has_string(' WAN ')]
-        
-        return rl
+        return self.get_interfacesbyrole('wan')
     
     @property
     def get_laninterfaces(self):
-        rl = [lv[0].split()[-1] for lv in self.get_sectioninterface if lv.has_string(' LAN ')]
-        
-        return rl
+        return self.get_interfacesbyrole('lan')
     
     @property
     def get_wapinterfaces(self):
-        rl = [lv[0].split()[-1] for lv in self.get_sectioninterface if lv.has_string(' WAP ')]
-        
-        return rl
+        return self.get_interfacesbyrole('wap')
     
+    def export_interfaces(self, f, fmt='csv', extractor=None):
+        '''
+        Write the interfaces of the configuration to the file object f,
+        as csv (with a header row) or json (a list of objects). Each
+        interface is written using CiscoPyConfInterface.as_dict, with the
+        configuration hostname included.
+
+        An extractor, a CiscoPyInterfaceExtractor with registered
+        attributes, may be given to export additional attributes.
+        '''
+        extractor = extractor or CiscoPyInterfaceExtractor()
+
+        try:
+            hostname = self.get_devicehostname
+        except IndexError:
+            hostname = None
+
+        rows = []
+
+        for r in extractor.extract(self):
+            d = {'hostname': hostname}
+            d.update(r.as_dict())
+            rows.append(d)
+
+        if fmt == 'json':
+            json.dump(rows, f, indent=2)
+        elif fmt == 'csv':
+            fieldnames = ['hostname'] + list(CiscoPyConfInterface.fields)
+            fieldnames += [name for name, _ in extractor.attribute_patterns]
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            raise ValueError('unknown export format: {}'.format(fmt))
+
     @property
     def get_obtacsnmpcommunity(self):
         rx = r'^snmp-server community.*[rRwW] snmp-access$'
@@ -276,19 +574,17 @@ class CiscoPyConfAsList(list):
         
         return CiscoPyConfAsList(nonobtacscs)
         
+    @profiled()
     def get_interfaceswith(self, rx):
-        interfaces = self.get_sectioninterface
         interfaces_with = []
+        crx = compile_rx(rx)
         
-        for i, v in enumerate(interfaces):
-            interface_with = CiscoPyConfAsList()
-                
-            for k, e in enumerate(v):
-                if re.search(rx, e):
-                    interface_with.append(e)
+        for r in self.get_interfacerecords:
+            interface_with = CiscoPyConfAsList(
+                [e for e in self[r.start:r.stop] if crx.search(e)])
             
             if len(interface_with) > 0:
-                interface_with.insert(0, v[0])
+                interface_with.insert(0, self[r.start])
                 interface_with.append(' exit')
                 interfaces_with.append(interface_with)
         
@@ -436,6 +732,10 @@ class CiscoPyConf(CiscoPyConfAsList):
     def get_cfgfromdevice(self, host, user='source', passwd='g04itMua',
                           enable_secret='cisco'):
         '''This method uses pexpect and ssh to get a running-config'''
+        # pexpect is only imported when a configuration is retrieved from a
+        # device, configuration analysis does not require it
+        import pexpect
+
         def pxspawn_cleanup():
             self.px_spawn.close()
             del(self.px_spawn)
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from ipaddress import ip_address, ip_interface
-from ciscopy.ciscopysnmp import CiscoPySNMP
 from ciscopy.ciscopyinterface import CiscoPyInterface
+from ciscopy.ciscopyinterface import CiscoPyInterfaceRecord
 
 class CiscoPyDevice(object):
     def _obtac_if_name(self, interface):
@@ -51,46 +51,88 @@ class CiscoPyDevice(object):
     
     @property
     def obtac_node_interface(self):
+        '''
+        Return the OB TAC node interface, the last interface with the
+        'node' role in interface_records, as a CiscoPyInterface.
+        '''
         node_interface = CiscoPyInterface()
         
-        for ifa, ifn in zip(self.cs.ifAlias, self.cs.ifName):
-            if (ifa.value.lower().startswith('*n**')
-                    or ifa.value.lower().startswith('*** emc')):
-                node_interface['name'] = self._obtac_if_name(ifn.value)
-                node_interface['oid index'] = ifa.oid_index
-                node_interface['description'] = ifa.value
+        for record in self.interface_records:
+            if record.role == 'node':
+                node_interface['name'] = record.name
+                node_interface['oid index'] = record.oid_index
+                node_interface['description'] = record.description
                 
-                for iaeii, iaea, iaenm in zip(self.cs.ipAdEntIfIndex,
-                                              self.cs.ipAdEntAddr,
-                                              self.cs.ipAdEntNetMask):
-                    if ifa.oid_index == iaeii.value:
-                        ipint = '/'.join([iaea.value, iaenm.value])
-                        node_interface['ip address'] = ip_interface(ipint)
+                if record.ip_address is not None:
+                    node_interface['ip address'] = record.ip_address
         
         return node_interface
     
     @property
     def wan_interfaces(self):
+        '''
+        Return a tuple of dicts of the interfaces with the 'wan' role in
+        interface_records. New code should use interface_records, which
+        has one schema for every interface.
+        '''
         wan_interface_list = list()
         
-        for ifa, ifn in zip(self.cs.ifAlias, self.cs.ifName):
-            if ifa.value.lower().startswith('*** ovpi_poll'):
-                wan_interface = {'name': self._obtac_if_name(ifn.value),
-                                 'oid_index': ifa.oid_index,
-                                 'description': ifa.value,
-                                 'circuit_id': ifa.value.strip(' *').split('is ')[-1]}
+        for record in self.interface_records:
+            if record.role == 'wan':
+                wan_interface = {'name': record.name,
+                                 'oid_index': record.oid_index,
+                                 'description': record.description,
+                                 'circuit_id': record.circuit_id}
                 
-                for iaeii, iaea, iaenm in zip(self.cs.ipAdEntIfIndex,
-                                              self.cs.ipAdEntAddr,
-                                              self.cs.ipAdEntNetMask):
-                    if iaeii.value == ifa.oid_index:
-                        wan_interface['ip address'] = (
-                            ip_interface('/'.join([iaea.value, iaenm.value])))
+                if record.ip_address is not None:
+                    wan_interface['ip address'] = record.ip_address
                 
                 wan_interface_list.append(wan_interface)
         
         return tuple(wan_interface_list)
 
+    @property
+    def interface_records(self):
+        '''
+        Return every interface of the device as a CiscoPyInterfaceRecord,
+        with the role set to 'node' for the OB TAC node interface and
+        'wan' for the WAN (OVPI polled) interfaces.
+        '''
+        try:
+            device = self.cs.sysName.value
+        except AttributeError:
+            device = None
+
+        ipaddresses = dict()
+
+        for iaeii, iaea, iaenm in zip(self.cs.ipAdEntIfIndex,
+                                      self.cs.ipAdEntAddr,
+                                      self.cs.ipAdEntNetMask):
+            ipaddresses[iaeii.value] = ip_interface(
+                '/'.join([iaea.value, iaenm.value]))
+
+        records = list()
+
+        for ifa, ifn in zip(self.cs.ifAlias, self.cs.ifName):
+            description = ifa.value.lower()
+            record = CiscoPyInterfaceRecord(
+                device=device,
+                oid_index=ifa.oid_index,
+                name=self._obtac_if_name(ifn.value),
+                description=ifa.value,
+                ip_address=ipaddresses.get(ifa.oid_index))
+
+            if (description.startswith('*n**')
+                    or description.startswith('*** emc')):
+                record.role = 'node'
+            elif description.startswith('*** ovpi_poll'):
+                record.role = 'wan'
+                record.circuit_id = ifa.value.strip(' *').split('is ')[-1]
+
+            records.append(record)
+
+        return tuple(records)
+
 class CiscoPyRouter(CiscoPyDevice):
     pass
 
@@ -7,8 +7,10 @@ elements.
 The class CiscoIPv4Interface defined in this module inherits the
 ipaddress.IPv4Interface class.'''
 
+import csv
+from array import array
 from collections import OrderedDict
-from ipaddress import IPv4Address, IPv4Interface
+from ipaddress import IPv4Address, IPv4Interface, IPv6Interface, ip_network
 #from easysnmp.variables import SNMPVariable, SNMPVariableList
 #from cisco.ciscosnmp import CiscoSNMP
 
@@ -20,6 +22,17 @@ class CiscoPyInterface(OrderedDict):
           self['ip address'] = None
           self['circuit id'] = None
           
+     def ipadentaddr_to_ipaddress(self, l):
+          '''
+          This method sets the attribute named dev_ips from a list of
+          RFC1213-MIB::ipAdEntAddr SNMP variables, as retrieved by
+          CiscoPySNMP.walk_ipadentaddr, or of ip address strings.
+
+          The attribute dev_ips is a set of class IPv4Address ip
+          addresses.
+          '''
+          self.dev_ips = {IPv4Address(getattr(v, 'value', v)) for v in l}
+
      def is_mgtip_natted(self, l):
           '''
           This method checks whether the OB TAC Management IP
@@ -29,15 +42,234 @@ class CiscoPyInterface(OrderedDict):
           named ipadentaddr_to_ipaddress to set the attribute
           named dev_ips.
           
-          The attribute dev_ips is a list of class IPv4Address ip
+          The attribute dev_ips is a set of class IPv4Address ip
           addresses.
           '''
           self.ipadentaddr_to_ipaddress(l)
+          ip = self['ip address']
+          
+          if isinstance(ip, IPv4Interface):
+               ip = ip.ip
           
-          if len(self.dev_ips) != 0:
-               if isinstance(self.dev_ips, list):
-                    if all(isinstance(v, IPv4Address) for v in self.dev_ips):
-                         if self.ip in self.dev_ips:
-                              self.mgtip_is_natted = False
-                         else:
-                              self.mgtip_is_natted = True
+          if len(self.dev_ips) != 0 and ip is not None:
+               if ip in self.dev_ips:
+                    self.mgtip_is_natted = False
+               else:
+                    self.mgtip_is_natted = True
+
+class CiscoPyInterfaceRecord(object):
+     '''
+     A memory efficient interface record with a fixed schema. This is
+     the same information as a CiscoPyInterface, or an item of
+     CiscoPyDevice.wan_interfaces, using attributes rather than dict
+     keys:
+         device:         the device hostname (sysName)
+         oid_index:      the IF-MIB ifIndex
+         name:           the interface name
+         description:    the interface description (ifAlias)
+         role:           'node', 'wan' or None
+         ip_address:     an ipaddress.IPv4Interface/IPv6Interface or None
+         circuit_id:     the circuit id of a wan interface or None
+     '''
+     __slots__ = ('device', 'oid_index', 'name', 'description', 'role',
+                  'ip_address', 'circuit_id')
+
+     def __init__(self, device=None, oid_index=None, name=None,
+                  description=None, role=None, ip_address=None,
+                  circuit_id=None):
+          self.device = device
+          self.oid_index = oid_index
+          self.name = name
+          self.description = description
+          self.role = role
+          self.ip_address = ip_address
+          self.circuit_id = circuit_id
+
+     def as_dict(self):
+          return OrderedDict((k, getattr(self, k)) for k in self.__slots__)
+
+     def __eq__(self, other):
+          if not isinstance(other, CiscoPyInterfaceRecord):
+               return NotImplemented
+          return all(getattr(self, k) == getattr(other, k)
+                     for k in self.__slots__)
+
+     def __repr__(self):
+          fields = ', '.join('{}={!r}'.format(k, getattr(self, k))
+                             for k in self.__slots__)
+          return '{}({})'.format(self.__class__.__name__, fields)
+
+
+class CiscoPyInterfaceTable(object):
+     '''
+     A columnar collection of CiscoPyInterfaceRecord objects. Each record
+     field is stored in its own column so that large tables may be
+     filtered without creating a record object per row.
+
+     An ip address is stored in arrays as its version (0 when a row has no
+     ip address), prefix length and the high and low 64 bits of the
+     address, and is only created as an ipaddress object on iteration,
+     indexing or export. The descriptions are also stored lower case, for
+     the case insensitive description filter.
+
+     Records are created from the columns on iteration or indexing.
+     '''
+     columns = CiscoPyInterfaceRecord.__slots__
+     str_columns = ('device', 'oid_index', 'name', 'description',
+                    'description_lower', 'role', 'circuit_id')
+     array_columns = (('ip_version', 'B'), ('ip_prefixlen', 'B'),
+                      ('ip_hi', 'Q'), ('ip_lo', 'Q'))
+
+     def __init__(self, records=()):
+          self._strings = dict()
+
+          for k in self.str_columns:
+               setattr(self, k, list())
+
+          for k, typecode in self.array_columns:
+               setattr(self, k, array(typecode))
+
+          self.extend(records)
+
+     def _intern(self, s):
+          # device names and roles repeat on many rows, store one copy
+          if s is None:
+               return s
+          return self._strings.setdefault(s, s)
+
+     def __len__(self):
+          return len(self.name)
+
+     def _ip_address(self, i):
+          version = self.ip_version[i]
+
+          if version == 4:
+               return IPv4Interface((self.ip_lo[i], self.ip_prefixlen[i]))
+          elif version == 6:
+               return IPv6Interface(((self.ip_hi[i] << 64) | self.ip_lo[i],
+                                     self.ip_prefixlen[i]))
+
+          return None
+
+     def _row(self, i):
+          return (self.device[i], self.oid_index[i], self.name[i],
+                  self.description[i], self.role[i], self._ip_address(i),
+                  self.circuit_id[i])
+
+     def __getitem__(self, i):
+          if i < 0:
+               i += len(self)
+          if not 0 <= i < len(self):
+               raise IndexError('table index out of range')
+
+          return CiscoPyInterfaceRecord(*self._row(i))
+
+     def __iter__(self):
+          return (CiscoPyInterfaceRecord(*self._row(i))
+                  for i in range(len(self)))
+
+     def append(self, record):
+          self.device.append(self._intern(record.device))
+          self.oid_index.append(record.oid_index)
+          self.name.append(record.name)
+          self.description.append(record.description)
+          self.description_lower.append(None if record.description is None
+                                        else record.description.lower())
+          self.role.append(self._intern(record.role))
+          self.circuit_id.append(record.circuit_id)
+
+          if record.ip_address is None:
+               self.ip_version.append(0)
+               self.ip_prefixlen.append(0)
+               self.ip_hi.append(0)
+               self.ip_lo.append(0)
+          else:
+               ip_int = int(record.ip_address.ip)
+               self.ip_version.append(record.ip_address.version)
+               self.ip_prefixlen.append(record.ip_address.network.prefixlen)
+               self.ip_hi.append(ip_int >> 64)
+               self.ip_lo.append(ip_int & 0xffffffffffffffff)
+
+     def extend(self, records):
+          for record in records:
+               self.append(record)
+
+     def _take(self, rows):
+          table = CiscoPyInterfaceTable()
+          table._strings = self._strings
+
+          for k in self.str_columns:
+               column = getattr(self, k)
+               setattr(table, k, [column[i] for i in rows])
+
+          for k, typecode in self.array_columns:
+               column = getattr(self, k)
+               setattr(table, k, array(typecode, [column[i] for i in rows]))
+
+          return table
+
+     def select(self, description_prefix=None, role=None, subnet=None,
+                device=None):
+          '''
+          Return a new table of the rows that match every given filter:
+              description_prefix: case insensitive description prefix
+              role:               role, or a collection of roles
+              subnet:             ip network (str or ipaddress network)
+                                  containing the row ip address
+              device:             device, or a collection of devices
+          '''
+          rows = range(len(self))
+
+          if device is not None:
+               devices = {device} if isinstance(device, str) else set(device)
+               column = self.device
+               rows = [i for i in rows if column[i] in devices]
+
+          if role is not None:
+               roles = {role} if isinstance(role, str) else set(role)
+               column = self.role
+               rows = [i for i in rows if column[i] in roles]
+
+          if subnet is not None:
+               network = ip_network(subnet)
+               network_int = int(network.network_address)
+               netmask_int = int(network.netmask)
+               network_hi = network_int >> 64
+               network_lo = network_int & 0xffffffffffffffff
+               netmask_hi = netmask_int >> 64
+               netmask_lo = netmask_int & 0xffffffffffffffff
+               version = network.version
+               versions = self.ip_version
+               ip_his = self.ip_hi
+               ip_los = self.ip_lo
+               rows = [i for i in rows if versions[i] == version
+                       and ip_los[i] & netmask_lo == network_lo
+                       and ip_his[i] & netmask_hi == network_hi]
+
+          if description_prefix is not None:
+               prefix = description_prefix.lower()
+               column = self.description_lower
+               rows = [i for i in rows
+                       if column[i] and column[i].startswith(prefix)]
+
+          return self._take(rows)
+
+     def to_rows(self, header=True):
+          '''Return the table as a list of tuples, ip addresses as str.'''
+          ip_addresses = [None if v is None else str(v)
+                          for v in map(self._ip_address, range(len(self)))]
+          columns = [ip_addresses if k == 'ip_address' else getattr(self, k)
+                     for k in self.columns]
+          rows = list(zip(*columns))
+
+          if header:
+               rows.insert(0, tuple(self.columns))
+
+          return rows
+
+     def to_csv(self, f):
+          '''Write the table, with a header row, to the file object f.'''
+          csv.writer(f).writerows(self.to_rows())
+
+     def __repr__(self):
+          return '{}({} rows)'.format(self.__class__.__name__, len(self))
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+'''
+The purpose of this module is to provide a fleet wide index of the ip
+addresses and subnets configured on network devices.
+
+The index is built from SNMP ipAdEnt data (CiscoPySNMP) and from the
+'ip address' lines of configurations (CiscoPyConfAsList). It answers:
+    *   which device/interface owns an ip address
+    *   the longest prefix match of an ip address
+    *   which subnets overlap a subnet, or each other
+
+Ip addresses and subnets are stored as integers. Exact lookups are dict
+lookups, subnets are additionally kept in a list sorted by network
+address so that overlap queries use bisect rather than a scan of every
+device. A device is updated incrementally by replacing its entries.
+'''
+
+from bisect import bisect_left, bisect_right, insort
+from ipaddress import ip_address, ip_interface, ip_network
+
+# Maximum prefix length per ip version
+MAX_PREFIXLEN = {4: 32, 6: 128}
+
+
+class CiscoPyIPIndex(object):
+    '''
+    An owner is a tuple of (device, interface name).
+
+    Entries are added per device with update_device, update_from_snmp or
+    update_from_config. Updating a device replaces all of its previous
+    entries.
+    '''
+    def __init__(self):
+        # device -> tuple of (interface name, ip interface)
+        self._device_entries = dict()
+        # (version, address int) -> set of owners
+        self._addresses = dict()
+        # version -> prefix length -> network int -> set of owners
+        self._networks = {4: dict(), 6: dict()}
+        # version -> sorted list of (network int, prefix length)
+        self._sorted_networks = {4: list(), 6: list()}
+
+    def __len__(self):
+        return sum(len(v) for v in self._device_entries.values())
+
+    @property
+    def devices(self):
+        return tuple(self._device_entries)
+
+    def _add(self, owner, ipint):
+        version = ipint.version
+        network = ipint.network
+        network_int = int(network.network_address)
+        prefixlen = network.prefixlen
+
+        self._addresses.setdefault((version, int(ipint.ip)), set()).add(owner)
+
+        by_network = self._networks[version].setdefault(prefixlen, dict())
+        if network_int not in by_network:
+            by_network[network_int] = set()
+            insort(self._sorted_networks[version], (network_int, prefixlen))
+        by_network[network_int].add(owner)
+
+    def _remove(self, owner, ipint):
+        version = ipint.version
+        network = ipint.network
+        network_int = int(network.network_address)
+        prefixlen = network.prefixlen
+        address_key = (version, int(ipint.ip))
+
+        owners = self._addresses.get(address_key, set())
+        owners.discard(owner)
+        if not owners:
+            self._addresses.pop(address_key, None)
+
+        by_network = self._networks[version].get(prefixlen, dict())
+        owners = by_network.get(network_int, set())
+        owners.discard(owner)
+        if not owners and network_int in by_network:
+            del(by_network[network_int])
+            sorted_networks = self._sorted_networks[version]
+            i = bisect_left(sorted_networks, (network_int, prefixlen))
+            del(sorted_networks[i])
+            if not by_network:
+                del(self._networks[version][prefixlen])
+
+    def remove_device(self, device):
+        '''Remove every entry of device from the index.'''
+        for name, ipint in self._device_entries.pop(device, ()):
+            self._remove((device, name), ipint)
+
+    def update_device(self, device, entries):
+        '''
+        Replace the entries of device. entries is an iterable of
+        (interface name, ip interface) where the ip interface is an
+        ipaddress.IPv4Interface/IPv6Interface or a str such as
+        '10.1.1.1/255.255.255.0' or '10.1.1.1/24'. A device without
+        entries is removed.
+        '''
+        entries = tuple((name, ip_interface(ipint))
+                        for name, ipint in entries)
+        self.remove_device(device)
+
+        if not entries:
+            return
+
+        for name, ipint in entries:
+            self._add((device, name), ipint)
+
+        self._device_entries[device] = entries
+
+    def update_from_snmp(self, device, cs):
+        '''
+        Replace the entries of device from a CiscoPySNMP object that has
+        retrieved ipAdEntIfIndex, ipAdEntAddr, ipAdEntNetMask and ifName
+        (refer to CiscoPySNMP.get_cmdbdata).
+        '''
+        ifnames = dict((v.oid_index, v.value) for v in cs.ifName or [])
+        entries = list()
+
+        for iaeii, iaea, iaenm in zip(cs.ipAdEntIfIndex or [],
+                                      cs.ipAdEntAddr or [],
+                                      cs.ipAdEntNetMask or []):
+            entries.append((ifnames.get(iaeii.value),
+                            '/'.join([iaea.value, iaenm.value])))
+
+        self.update_device(device, entries)
+
+    def update_from_config(self, cc, device=None):
+        '''
+        Replace the entries of a device from the 'ip address' lines of the
+        interface sections of a CiscoPyConfAsList. The device defaults to
+        the configuration hostname.
+        '''
+        if device is None:
+            device = cc.get_devicehostname
+
+        entries = list()
+
+        for r in cc.get_interfacerecords:
+            if r.ip_address is not None:
+                entries.append((r.name, r.ip_address))
+            for ipint in r.secondary_ip_addresses:
+                entries.append((r.name, ipint))
+
+        self.update_device(device, entries)
+
+    def owner(self, address):
+        '''Return the set of owners of the ip address.'''
+        address = ip_address(address)
+        return set(self._addresses.get((address.version, int(address)), ()))
+
+    def longest_prefix_match(self, address):
+        '''
+        Return a tuple of (ip network, set of owners) of the most
+        specific subnet containing the ip address, or None.
+        '''
+        address = ip_address(address)
+        address_int = int(address)
+        max_prefixlen = MAX_PREFIXLEN[address.version]
+        networks = self._networks[address.version]
+
+        for prefixlen in sorted(networks, reverse=True):
+            mask = ((1 << prefixlen) - 1) << (max_prefixlen - prefixlen)
+            owners = networks[prefixlen].get(address_int & mask)
+            if owners:
+                network = ip_network((address_int & mask, prefixlen))
+                return network, set(owners)
+
+        return None
+
+    def overlaps(self, network):
+        '''
+        Return a list of (ip network, set of owners) of every indexed
+        subnet that overlaps network: the subnets containing it, the
+        subnet itself and the subnets within it.
+        '''
+        network = ip_network(network, strict=False)
+        version = network.version
+        network_int = int(network.network_address)
+        broadcast_int = int(network.broadcast_address)
+        max_prefixlen = MAX_PREFIXLEN[version]
+        networks = self._networks[version]
+        rl = list()
+
+        # subnets containing network, and network itself
+        for prefixlen in sorted(networks):
+            if prefixlen > network.prefixlen:
+                break
+            mask = ((1 << prefixlen) - 1) << (max_prefixlen - prefixlen)
+            owners = networks[prefixlen].get(network_int & mask)
+            if owners:
+                rl.append((ip_network((network_int & mask, prefixlen)),
+                           set(owners)))
+
+        # subnets within network start between its network and broadcast
+        # addresses
+        sorted_networks = self._sorted_networks[version]
+        start = bisect_left(sorted_networks,
+                            (network_int, network.prefixlen + 1))
+        stop = bisect_right(sorted_networks, (broadcast_int, max_prefixlen))
+
+        for subnet_int, prefixlen in sorted_networks[start:stop]:
+            rl.append((ip_network((subnet_int, prefixlen)),
+                       set(networks[prefixlen][subnet_int])))
+
+        return rl
+
+    def find_overlaps(self, version=4):
+        '''
+        Return a list of (outer ip network, inner ip network) of every
+        pair of indexed subnets where one contains, or equals, the other
+        and the subnets are owned by different devices.
+
+        The subnets are visited once in sorted order, keeping a stack of
+        the subnets containing the current one.
+        '''
+        max_prefixlen = MAX_PREFIXLEN[version]
+        networks = self._networks[version]
+        stack = list()
+        rl = list()
+
+        for network_int, prefixlen in self._sorted_networks[version]:
+            owners = networks[prefixlen][network_int]
+            devices = set(owner[0] for owner in owners)
+            broadcast_int = network_int | ((1 << (max_prefixlen - prefixlen)) - 1)
+            network = ip_network((network_int, prefixlen))
+
+            while stack and stack[-1][0] < network_int:
+                stack.pop()
+
+            if len(devices) > 1:
+                rl.append((network, network))
+
+            for _, outer, outer_devices in stack:
+                if len(outer_devices | devices) > 1:
+                    rl.append((outer, network))
+
+            stack.append((broadcast_int, network, devices))
+
+        return rl
+
+    def __repr__(self):
+        return '{}({} devices, {} entries)'.format(self.__class__.__name__,
+                                                  len(self._device_entries),
+                                                  len(self))
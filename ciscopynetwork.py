@@ -4,37 +4,523 @@ This purpose of this module is to provide network related methods and
 attributes associated with retrieving, storing, and processing network devices.
 '''
 #from pyping import ping as pping
+import asyncio
+import itertools
+import re
+import select
+import socket
+import struct
+import time
+from collections import deque
+from ipaddress import ip_address
 from subprocess import run as sp_run, PIPE as sp_PIPE
+from subprocess import Popen as sp_Popen, DEVNULL as sp_DEVNULL
+
+# Reachability results shared by every CiscoPyNetwork instance. Maps an
+# ip address to a tuple of (expiry time, round trip time in ms or None).
+_reachability_cache = dict()
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+# .1.3.6.1.2.1.1.5.0 = SNMPv2-MIB::sysName.0
+SYSNAME_OID = (1, 3, 6, 1, 2, 1, 1, 5, 0)
+
+_snmp_request_ids = itertools.count(1)
+
+# ping -q prints only the min/avg/max summary, otherwise time= per reply
+_PING_AVG_RX = re.compile(r'= [\d.]+/([\d.]+)/')
+_PING_TIME_RX = re.compile(r'time[=<]([\d.]+) ?ms')
+
+
+def _cache_get(ipaddress):
+    try:
+        expiry, rtt = _reachability_cache[ipaddress]
+    except KeyError:
+        return False, None
+
+    if expiry < time.monotonic():
+        del(_reachability_cache[ipaddress])
+        return False, None
+
+    return True, rtt
+
+
+def _cache_set(results, ttl):
+    expiry = time.monotonic() + ttl
+
+    for ipaddress, rtt in results.items():
+        _reachability_cache[ipaddress] = (expiry, rtt)
+
+
+def _ping_rtt(output):
+    '''
+    Return the average round trip time in ms from the output of a
+    successful ping, or 0.0 when it cannot be parsed, for example with a
+    localised ping.
+    '''
+    m = _PING_AVG_RX.search(output) or _PING_TIME_RX.search(output)
+
+    return float(m.group(1)) if m else 0.0
+
+
+def _icmp_sweep(addresses, max_inflight, timeout):
+    '''
+    Send one ICMP echo request to every IPv4 address using an
+    unprivileged ICMP datagram socket. The kernel sets the ICMP
+    identifier and checksum, replies are matched on the sequence number
+    and source address.
+
+    Raises OSError when ICMP datagram sockets are not permitted, refer to
+    the net.ipv4.ping_group_range sysctl.
+    '''
+    results = dict.fromkeys(addresses)
+    pending = deque(addresses)
+    inflight = dict()
+    sent = deque()
+    seq = 0
+    blocked = False
+    max_inflight = min(max_inflight, 0xFFFF)
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM,
+                       socket.IPPROTO_ICMP) as sock:
+        sock.setblocking(False)
+
+        while pending or inflight:
+            blocked = False
+            while pending and len(inflight) < max_inflight:
+                seq = seq % 0xFFFF + 1
+                while seq in inflight:
+                    seq = seq % 0xFFFF + 1
+                ipaddress = pending.popleft()
+                packet = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, 0,
+                                     seq) + b'ciscopy'
+                try:
+                    sock.sendto(packet, (ipaddress, 0))
+                except BlockingIOError:
+                    pending.appendleft(ipaddress)
+                    blocked = True
+                    break
+                except OSError:
+                    # no route to host and the like, leave as unreachable
+                    continue
+                sent_time = time.monotonic()
+                inflight[seq] = (ipaddress, sent_time)
+                sent.append((sent_time, seq))
+
+            now = time.monotonic()
+            while sent and sent[0][0] + timeout <= now:
+                _, expired = sent.popleft()
+                if expired in inflight and inflight[expired][1] + timeout <= now:
+                    del(inflight[expired])
+
+            if not inflight:
+                if blocked:
+                    # the send buffer is full, wait for room rather than spin
+                    select.select([], [sock], [], timeout)
+                continue
+
+            wait = max(sent[0][0] + timeout - now, 0) if sent else timeout
+            readable, _, _ = select.select([sock], [sock] if blocked else [],
+                                           [], wait)
+
+            while readable:
+                try:
+                    data, (source, _) = sock.recvfrom(1024)
+                except OSError:
+                    break
+
+                received = time.monotonic()
+
+                if len(data) < 8 or data[0] != ICMP_ECHO_REPLY:
+                    continue
+
+                reply_seq = struct.unpack('!H', data[6:8])[0]
+                if (reply_seq in inflight
+                        and inflight[reply_seq][0] == source):
+                    ipaddress, sent_time = inflight.pop(reply_seq)
+                    results[ipaddress] = (received - sent_time) * 1000
+
+    return results
+
+
+def _ping_sweep(addresses, max_inflight, timeout):
+    '''
+    Run one ping subprocess per address, keeping at most max_inflight
+    subprocesses running at a time. Used for IPv6 and host names, and
+    when ICMP datagram sockets are not permitted.
+    '''
+    results = dict.fromkeys(addresses)
+    pending = deque(addresses)
+    running = list()
+    # the ping -W option is in whole seconds on Linux
+    wait_time = str(max(int(round(timeout)), 1))
+
+    while pending or running:
+        while pending and len(running) < max_inflight:
+            ipaddress = pending.popleft()
+            ping_cmd = ['ping', '-n', '-q', '-c', '1', '-W', wait_time,
+                        ipaddress]
+            if ':' in ipaddress:
+                ping_cmd.insert(1, '-6')
+            running.append((ipaddress,
+                            sp_Popen(ping_cmd, stdout=sp_PIPE,
+                                     stderr=sp_DEVNULL,
+                                     universal_newlines=True)))
+
+        still_running = list()
+
+        for ipaddress, sp in running:
+            if sp.poll() is None:
+                still_running.append((ipaddress, sp))
+                continue
+
+            output = sp.stdout.read()
+            sp.stdout.close()
+
+            if sp.returncode == 0:
+                results[ipaddress] = _ping_rtt(output)
+
+        running = still_running
+
+        if running:
+            time.sleep(0.01)
+
+    return results
+
+
+def _ber_tlv(tag, payload):
+    length = len(payload)
+
+    if length < 0x80:
+        return bytes([tag, length]) + payload
+
+    length_bytes = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+
+    return bytes([tag, 0x80 | len(length_bytes)]) + length_bytes + payload
+
+
+def _ber_integer(value):
+    return _ber_tlv(0x02, value.to_bytes((value.bit_length() + 8) // 8,
+                                         'big', signed=True))
+
+
+def _ber_oid(oid):
+    payload = bytearray([oid[0] * 40 + oid[1]])
+
+    for sub_id in oid[2:]:
+        sub_id_bytes = [sub_id & 0x7F]
+        sub_id >>= 7
+        while sub_id:
+            sub_id_bytes.insert(0, 0x80 | (sub_id & 0x7F))
+            sub_id >>= 7
+        payload.extend(sub_id_bytes)
+
+    return _ber_tlv(0x06, bytes(payload))
+
+
+def _ber_decode(data, offset=0):
+    '''Return the (tag, payload, next offset) of the BER TLV at offset.'''
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+
+    if length & 0x80:
+        length_len = length & 0x7F
+        length = int.from_bytes(data[offset:offset + length_len], 'big')
+        offset += length_len
+
+    if offset + length > len(data):
+        raise ValueError('truncated BER encoding')
+
+    return tag, data[offset:offset + length], offset + length
+
+
+def _snmp_get_request(community, request_id, oid=SYSNAME_OID):
+    '''Encode an SNMPv2c GetRequest-PDU for a single oid.'''
+    varbind = _ber_tlv(0x30, _ber_oid(oid) + b'\x05\x00')
+    pdu = _ber_tlv(0xA0, _ber_integer(request_id) + _ber_integer(0)
+                   + _ber_integer(0) + _ber_tlv(0x30, varbind))
+
+    return _ber_tlv(0x30, _ber_integer(1)
+                    + _ber_tlv(0x04, community.encode()) + pdu)
+
+
+def _snmp_get_response(data):
+    '''
+    Decode an SNMPv2c GetResponse-PDU with a single varbind. Returns a
+    tuple of (request id, value), the value is None when the agent
+    returned an error or an exception (noSuchObject etc.).
+    '''
+    _, message, _ = _ber_decode(data)
+    _, _, offset = _ber_decode(message)
+    _, _, offset = _ber_decode(message, offset)
+    tag, pdu, _ = _ber_decode(message, offset)
+
+    if tag != 0xA2:
+        raise ValueError('not a GetResponse-PDU')
+
+    _, request_id, offset = _ber_decode(pdu)
+    _, error_status, offset = _ber_decode(pdu, offset)
+    _, _, offset = _ber_decode(pdu, offset)
+    _, varbinds, _ = _ber_decode(pdu, offset)
+    _, varbind, _ = _ber_decode(varbinds)
+    _, _, offset = _ber_decode(varbind)
+    tag, value, _ = _ber_decode(varbind, offset)
+    request_id = int.from_bytes(request_id, 'big', signed=True)
+
+    if int.from_bytes(error_status, 'big') or tag != 0x04:
+        return request_id, None
+
+    return request_id, value.decode('utf-8', 'replace')
+
+
+class _SNMPGetProtocol(asyncio.DatagramProtocol):
+    def __init__(self, request_id, future):
+        self.request_id = request_id
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        try:
+            request_id, value = _snmp_get_response(data)
+        except (IndexError, ValueError):
+            return
+
+        if request_id == self.request_id and not self.future.done():
+            self.future.set_result(value)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+async def _probe_tcp(host, port, timeout):
+    '''Return the TCP connect time in ms, or None.'''
+    start = time.monotonic()
+
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port),
+                                           timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+    latency = (time.monotonic() - start) * 1000
+    writer.close()
+
+    # wait for the socket to close so that sweeps of many hosts do not
+    # accumulate sockets, abort a close that does not complete promptly
+    try:
+        await asyncio.wait_for(writer.wait_closed(), min(timeout, 1.0))
+    except (OSError, asyncio.TimeoutError):
+        writer.transport.abort()
+
+    return latency
+
+
+async def _probe_snmp(host, community, port, timeout):
+    '''Return a tuple of (round trip time in ms, sysName), or
+    (None, None) when the agent does not answer.'''
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    request_id = next(_snmp_request_ids) & 0x7FFFFFFF
+
+    try:
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _SNMPGetProtocol(request_id, future),
+            remote_addr=(host, port))
+    except OSError:
+        return None, None
+
+    start = time.monotonic()
+
+    try:
+        transport.sendto(_snmp_get_request(community, request_id))
+        sysname = await asyncio.wait_for(future, timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None, None
+    finally:
+        transport.close()
+
+    return (time.monotonic() - start) * 1000, sysname
+
+
+async def async_probe_services(hosts, communities='public', timeout=2.0,
+                               max_concurrency=1000, ssh_port=22,
+                               snmp_port=161):
+    '''
+    The asyncio implementation of CiscoPyNetwork.probe_services. Refer
+    to that method for the arguments and the result.
+    '''
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def probe(host):
+        if isinstance(communities, dict):
+            community = communities.get(host)
+        else:
+            community = communities
+
+        async with semaphore:
+            if community is None:
+                ssh = await _probe_tcp(host, ssh_port, timeout)
+                snmp, sysname = None, None
+            else:
+                ssh, (snmp, sysname) = await asyncio.gather(
+                    _probe_tcp(host, ssh_port, timeout),
+                    _probe_snmp(host, community, snmp_port, timeout))
+
+        return host, {'ssh': ssh, 'snmp': snmp, 'sysname': sysname}
+
+    results = await asyncio.gather(*[probe(host)
+                                     for host in dict.fromkeys(hosts)])
+
+    return dict(results)
+
 
 class CiscoPyNetwork(object):
     def __init__(self,
                  ipaddress,
-                 wait_time='3000',
+                 wait_time='3',
                  count='2',
-                 packet_size='55'):
+                 packet_size='55',
+                 cache_ttl=300):
         self.ipaddress = ipaddress
         self.wait_time = wait_time
         self.count = count
         self.packet_size = packet_size
+        self.cache_ttl = cache_ttl
 
     @property
     def is_reachable(self):
         '''
         Is the network device reachable. Basically a ping test.
-        
+
         The ping command assumes that this method will executed on a
-        Linux/Unix type computer.
+        Linux/Unix type computer. The ping -W option, wait_time, is in
+        seconds.
+
+        A result recorded by a sweep, or by a previous is_reachable
+        call, within cache_ttl seconds is returned without pinging. The
+        round trip time cached here is the average parsed from the ping
+        output, 0.0 when the output cannot be parsed.
         '''
+        cached, rtt = _cache_get(self.ipaddress)
+
+        if cached:
+            return rtt is not None
+
         result = False
+        rtt = None
         ping_cmd = ['ping', '-c', self.count, '-W', self.wait_time, '-s',
                     self.packet_size, self.ipaddress]
         spr_cp = sp_run(ping_cmd, stdout=sp_PIPE,
-                        stderr=sp_PIPE)
-        
+                        stderr=sp_PIPE, universal_newlines=True)
+
         if spr_cp.returncode == 0:
             result = True
+            rtt = _ping_rtt(spr_cp.stdout)
+
+        if self.cache_ttl:
+            _cache_set({self.ipaddress: rtt}, self.cache_ttl)
 
         return result
-    
+
+    @staticmethod
+    def sweep(addresses, max_inflight=512, timeout=1.0, cache_ttl=300,
+              use_cache=True):
+        '''
+        Check the reachability of many ip addresses concurrently.
+
+        Returns a dict of ip address to the round trip time in
+        milliseconds, or None when the ip address is not reachable.
+
+        IPv4 addresses are probed using an unprivileged ICMP datagram
+        socket with at most max_inflight outstanding echo requests. When
+        such sockets are not permitted, and for IPv6 addresses or host
+        names, at most max_inflight ping subprocesses are run at a time.
+        An address that does not answer within timeout seconds is not
+        reachable.
+
+        Results are cached for cache_ttl seconds and are used by
+        is_reachable. Cached results are returned without probing unless
+        use_cache is False.
+        '''
+        results = dict()
+        icmp_addresses = list()
+        ping_addresses = list()
+
+        for ipaddress in dict.fromkeys(addresses):
+            if use_cache:
+                cached, rtt = _cache_get(ipaddress)
+                if cached:
+                    results[ipaddress] = rtt
+                    continue
+
+            try:
+                version = ip_address(ipaddress).version
+            except ValueError:
+                version = None
+
+            if version == 4:
+                icmp_addresses.append(ipaddress)
+            else:
+                ping_addresses.append(ipaddress)
+
+        probed = dict()
+
+        if icmp_addresses:
+            try:
+                probed.update(_icmp_sweep(icmp_addresses, max_inflight,
+                                          timeout))
+            except OSError:
+                ping_addresses.extend(icmp_addresses)
+
+        if ping_addresses:
+            probed.update(_ping_sweep(ping_addresses, max_inflight, timeout))
+
+        if cache_ttl:
+            _cache_set(probed, cache_ttl)
+
+        results.update(probed)
+
+        return results
+
+    @staticmethod
+    def probe_services(hosts, communities='public', timeout=2.0,
+                       max_concurrency=1000, ssh_port=22, snmp_port=161):
+        '''
+        Check which management services answer on many hosts
+        concurrently: a TCP connect to the ssh port, used by
+        CiscoPyConf.get_cfgfromdevice, and an SNMPv2c get of
+        SNMPv2-MIB::sysName.0, used by CiscoPySNMP.
+
+        communities is either a single SNMP community or a dict of host
+        to SNMP community. A host without a community is not SNMP probed.
+
+        Returns a dict of host to a dict of:
+            ssh:        TCP connect time in ms, or None
+            snmp:       SNMP round trip time in ms, or None
+            sysname:    SNMPv2-MIB::sysName.0, or None
+
+        Each probe is abandoned after timeout seconds. At most
+        max_concurrency hosts are probed at a time.
+
+        This method may not be called from a running event loop, await
+        async_probe_services instead.
+        '''
+        return asyncio.run(async_probe_services(
+            hosts, communities=communities, timeout=timeout,
+            max_concurrency=max_concurrency, ssh_port=ssh_port,
+            snmp_port=snmp_port))
+
+    @staticmethod
+    def get_collectors(services):
+        '''
+        Return the collectors that may be used for a host, given its
+        probe_services result: 'ssh' for CiscoPyConf.get_cfgfromdevice
+        and 'snmp' for CiscoPySNMP.
+        '''
+        return tuple(collector for collector in ('ssh', 'snmp')
+                     if services.get(collector) is not None)
+
     def __repr__(self):
         return '{}({})'.format(self.__class__.__name__, self.__dict__)
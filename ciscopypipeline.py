@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+'''
+The purpose of this module is to provide a staged pipeline that builds
+CiscoPyDevice objects for a fleet of network devices.
+
+Each device passes through the following stages:
+    *   reachability:   CiscoPyNetwork.is_reachable
+    *   snmp:           CiscoPySNMP.get_cmdbdata
+    *   config:         CiscoPyConf.get_cfgfromdevice
+    *   classify:       CiscoPyDevice.reset_device_class
+
+A reachable device is sent to the snmp and the config stages, which run
+in parallel as independent branches. The results of the two branches are
+joined by hostname in front of the classify stage.
+
+Every stage has its own pool of worker threads and a bounded queue in
+front of it. A full queue blocks the stage feeding it (backpressure),
+except for the queues of the two branches: records for a branch whose
+queue is full wait in the backlog of the branch, so that a slow branch
+(for example SSH to the devices) does not stall the other branch.
+
+The number of devices between the reachability and the classify stages,
+in the branches or waiting for the other branch to finish, is limited to
+max_inflight. Once the limit is reached the reachability stage waits, so
+a slow branch stalls the other branch only after it is max_inflight
+devices behind.
+'''
+
+import time
+import threading
+from queue import Queue
+from ciscopy.ciscopyconf import CiscoPyConf
+from ciscopy.ciscopydevice import CiscoPyDevice
+from ciscopy.ciscopynetwork import CiscoPyNetwork
+from ciscopy.ciscopysnmp import CiscoPySNMP
+
+# Marks the end of the input of a stage worker
+_STOP = object()
+
+
+class CiscoPyPipelineStage(object):
+    '''
+    A pipeline stage. func is called with the device record, a dict, and
+    returns True when the record continues to the next stage or False
+    when the record is finished (for example the device is not
+    reachable). An exception raised by func finishes the record with the
+    exception as the statuscause.
+
+    The backlog of a branch stage holds the records that are waiting for
+    a place in its queue, up to backlog_size records.
+    '''
+    def __init__(self, name, func, workers=8, queue_size=100,
+                 backlog_size=None):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = Queue(maxsize=queue_size)
+        if backlog_size is None:
+            self.backlog = None
+        else:
+            self.backlog = Queue(maxsize=backlog_size)
+        self.lock = threading.Lock()
+        self.active_workers = 0
+        self.received = 0
+        self.passed = 0
+        self.finished = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.start_time = None
+        self.stop_time = None
+
+    @property
+    def stats(self):
+        '''Return the throughput counters of the stage.'''
+        with self.lock:
+            if self.start_time is None:
+                elapsed = 0.0
+            else:
+                elapsed = (self.stop_time or time.monotonic()) - self.start_time
+
+            done = self.passed + self.finished + self.failed
+
+            return {'received': self.received,
+                    'passed': self.passed,
+                    'finished': self.finished,
+                    'failed': self.failed,
+                    'queued': self.queue.qsize(),
+                    'backlog': self.backlog.qsize() if self.backlog else 0,
+                    'busy_time': self.busy_time,
+                    'elapsed': elapsed,
+                    'throughput': done / elapsed if elapsed else 0.0}
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, self.name)
+
+
+class CiscoPyPipeline(object):
+    '''
+    Build device records for many devices concurrently.
+
+    devices is a dict of hostname to SNMP community. cfg_kwargs are
+    passed to CiscoPyConf.get_cfgfromdevice (user, passwd,
+    enable_secret). max_inflight is the most devices between the
+    reachability and classify stages, refer to the module documentation.
+
+    A finished device record is a dict of:
+        hostname:           the device hostname
+        status:             True when every stage completed
+        statuscause:        why the record finished early, or None
+        device_class:       CiscoPyDevice.cmdb_class
+        node_interface:     the CiscoPyInterfaceRecord of the node
+                            interface, or None
+        wan_interfaces:     a tuple of the CiscoPyInterfaceRecord of the
+                            WAN interfaces
+        snmp_community:     the SNMP community used to poll the device
+        device:             the CiscoPyDevice object
+    '''
+    def __init__(self, devices, reachability_workers=32, snmp_workers=32,
+                 config_workers=16, classify_workers=4, queue_size=100,
+                 max_inflight=1000, cfg_kwargs=None):
+        self.devices = devices
+        self.cfg_kwargs = cfg_kwargs or dict()
+        self.reachability = CiscoPyPipelineStage(
+            'reachability', self._reachability, reachability_workers,
+            queue_size)
+        self.snmp = CiscoPyPipelineStage('snmp', self._snmp, snmp_workers,
+                                         queue_size, max_inflight)
+        self.config = CiscoPyPipelineStage('config', self._config,
+                                           config_workers, queue_size,
+                                           max_inflight)
+        self.classify = CiscoPyPipelineStage('classify', self._classify,
+                                             classify_workers, queue_size)
+        self.stages = [self.reachability, self.snmp, self.config,
+                       self.classify]
+        self.output = Queue(maxsize=queue_size)
+        # hostname -> (record, passed) of the branch that finished first
+        self._joining = dict()
+        self._join_lock = threading.Lock()
+        self._running_branches = 0
+        self.max_inflight = max_inflight
+        self._inflight = threading.BoundedSemaphore(max_inflight)
+
+    def _reachability(self, record):
+        if CiscoPyNetwork(record['hostname']).is_reachable:
+            return True
+
+        record['statuscause'] = 'not reachable'
+        return False
+
+    def _snmp(self, record):
+        cs = CiscoPySNMP(record['hostname'], record['snmp_community'])
+        cs.get_cmdbdata
+
+        if cs.entLogicalType is None or cs.sysName is None:
+            record['statuscause'] = 'snmp: no response'
+            return False
+
+        record['cs'] = cs
+        return True
+
+    def _config(self, record):
+        cc = CiscoPyConf()
+        cc.get_cfgfromdevice(record['hostname'], **self.cfg_kwargs)
+
+        if not cc.status:
+            record['statuscause'] = 'config: {}'.format(cc.statuscause)
+            return False
+
+        record['cc'] = cc
+        return True
+
+    def _classify(self, record):
+        device = CiscoPyDevice()
+        device.cs = record.pop('cs')
+        device.cc = record.pop('cc')
+        device.reset_device_class
+        record['device'] = device
+        record['device_class'] = device.cmdb_class
+        interfaces = device.interface_records
+        node_interfaces = [r for r in interfaces if r.role == 'node']
+        record['node_interface'] = (node_interfaces[-1] if node_interfaces
+                                    else None)
+        record['wan_interfaces'] = tuple(r for r in interfaces
+                                         if r.role == 'wan')
+        record['status'] = True
+        return True
+
+    def _finish(self, record):
+        record.pop('cs', None)
+        record.pop('cc', None)
+        self.output.put(record)
+
+    def _join(self, record, passed):
+        # Join the snmp and config branch records of a device, the record
+        # of the branch that finishes first waits for the other one
+        with self._join_lock:
+            first = self._joining.pop(record['hostname'], None)
+            if first is None:
+                self._joining[record['hostname']] = (record, passed)
+                return
+
+        other, other_passed = first
+        causes = [r['statuscause'] for r in (other, record)
+                  if r['statuscause']]
+
+        for key in ('cs', 'cc'):
+            if key in other:
+                record[key] = other[key]
+
+        if passed and other_passed:
+            self.classify.queue.put(record)
+        else:
+            record['statuscause'] = '; '.join(causes)
+            self._finish(record)
+
+        self._inflight.release()
+
+    def _route(self, stage, record, passed):
+        if stage is self.reachability:
+            if passed:
+                # wait while max_inflight devices are in the branches
+                self._inflight.acquire()
+                # each branch updates its own copy of the record
+                self.snmp.backlog.put(dict(record))
+                self.config.backlog.put(dict(record))
+            else:
+                self._finish(record)
+        elif stage is self.classify:
+            self._finish(record)
+        else:
+            self._join(record, passed)
+
+    def _stop_next(self, stage):
+        # Called by the last worker of stage to stop the stages after it
+        if stage is self.reachability:
+            self.snmp.backlog.put(_STOP)
+            self.config.backlog.put(_STOP)
+        elif stage is self.classify:
+            self.output.put(_STOP)
+        else:
+            with self._join_lock:
+                self._running_branches -= 1
+                last_branch = self._running_branches == 0
+            if last_branch:
+                for _ in range(self.classify.workers):
+                    self.classify.queue.put(_STOP)
+
+    def _dispatch(self, stage):
+        # Move the backlog of a branch stage to its bounded queue
+        while True:
+            record = stage.backlog.get()
+            if record is _STOP:
+                break
+            stage.queue.put(record)
+
+        for _ in range(stage.workers):
+            stage.queue.put(_STOP)
+
+    def _worker(self, stage):
+        while True:
+            record = stage.queue.get()
+
+            if record is _STOP:
+                break
+
+            with stage.lock:
+                stage.received += 1
+
+            start = time.monotonic()
+
+            try:
+                passed = stage.func(record)
+            except Exception as exception:
+                record['statuscause'] = '{}: {}'.format(stage.name, exception)
+                passed = None
+
+            with stage.lock:
+                stage.busy_time += time.monotonic() - start
+                if passed:
+                    stage.passed += 1
+                elif passed is None:
+                    stage.failed += 1
+                else:
+                    stage.finished += 1
+
+            self._route(stage, record, passed)
+
+        with stage.lock:
+            stage.active_workers -= 1
+            last_worker = stage.active_workers == 0
+            if last_worker:
+                stage.stop_time = time.monotonic()
+
+        if last_worker:
+            self._stop_next(stage)
+
+    def _feed(self):
+        first = self.reachability
+
+        for hostname, community in self.devices.items():
+            first.queue.put({'hostname': hostname,
+                             'status': False,
+                             'statuscause': None,
+                             'device_class': None,
+                             'node_interface': None,
+                             'wan_interfaces': None,
+                             'snmp_community': community,
+                             'device': None})
+
+        for _ in range(first.workers):
+            first.queue.put(_STOP)
+
+    def run(self):
+        '''
+        Run the pipeline, yielding each device record as it is finished.
+        Records are yielded in the order in which they finish, not the
+        order of devices.
+        '''
+        self._joining = dict()
+        self._running_branches = 2
+        threads = [threading.Thread(target=self._feed, daemon=True)]
+        threads.extend(threading.Thread(target=self._dispatch, args=(stage,),
+                                        daemon=True)
+                       for stage in (self.snmp, self.config))
+
+        for stage in self.stages:
+            stage.active_workers = stage.workers
+            stage.start_time = time.monotonic()
+            stage.stop_time = None
+            threads.extend(threading.Thread(target=self._worker,
+                                            args=(stage,), daemon=True)
+                           for _ in range(stage.workers))
+
+        for thread in threads:
+            thread.start()
+
+        # finished records reach the output queue before the stop marker
+        # of the classify stage, which is only sent once every earlier
+        # stage has stopped
+        while True:
+            record = self.output.get()
+            if record is _STOP:
+                break
+            yield record
+
+        for thread in threads:
+            thread.join()
+
+    @property
+    def stats(self):
+        '''Return the throughput counters of every stage, by stage name.'''
+        return dict((stage.name, stage.stats) for stage in self.stages)
@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+'''
+The purpose of this module is to provide a high frequency interface
+counter poller built on top of the CiscoPySNMP class.
+
+Samples of IF-MIB::ifHCInOctets, IF-MIB::ifHCOutOctets and
+IF-MIB::ifInErrors are stored in fixed depth ring buffers. The ring
+buffers are columnar, one flat array per counter, so that a single
+process may track a very large number of interfaces without the
+overhead of a python object per sample.
+
+Rates and utilisation are computed for every tracked interface in one
+batch over the columnar arrays. Counter wraps and discontinuities
+(device reloads, counter resets) are handled per interface. A device
+reload is detected from SNMPv2-MIB::sysUpTime, which is polled with the
+counters.
+'''
+
+import re
+import time
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from ciscopy.ciscopysnmp import CiscoPySNMP
+
+NAN = float('nan')
+
+# IF-MIB::ifHCInOctets and IF-MIB::ifHCOutOctets are Counter64,
+# IF-MIB::ifInErrors is a Counter32
+COUNTER64_MODULUS = 2 ** 64
+COUNTER32_MODULUS = 2 ** 32
+
+# Upper bound on the rate of an interface whose speed is unknown, in
+# bits per second. Used to detect discontinuities.
+UNKNOWN_SPEED_LIMIT = 1e12
+
+
+def _to_int(value):
+    # SNMP values are retrieved with use_sprint_value=True so a counter
+    # value is a string of digits. Anything else is treated as missing.
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_timeticks(value):
+    # sysUpTime as hundredths of a second. The sprint value of a TimeTicks
+    # includes the raw value in brackets, 'Timeticks: (1234) 0:00:12.34',
+    # or is the formatted value only, '1 day, 2:03:04.05'.
+    try:
+        m = re.search(r'\((\d+)\)', value)
+    except TypeError:
+        return None
+
+    if m:
+        return int(m.group(1))
+
+    m = re.search(r'(?:(\d+) days?, )?(\d+):(\d+):(\d+)(?:\.(\d+))?', value)
+    if m:
+        days, hours, minutes, seconds, hundredths = (
+            int(g or 0) for g in m.groups())
+        return ((((days * 24 + hours) * 60 + minutes) * 60 + seconds) * 100
+                + hundredths)
+
+    return _to_int(value)
+
+
+def _counter_delta(previous, current, modulus, max_delta):
+    '''
+    Return the difference between two counter samples, or None when
+    the difference can not be trusted.
+
+    A negative difference is a counter wrap when the wrapped difference
+    is no larger than max_delta, the most the counter could have
+    increased in the sample interval. Otherwise, or when a positive
+    difference is larger than max_delta, the counter is considered
+    discontinuous. A max_delta of None means there is no bound on the
+    difference, in which case only a Counter32 wrap is accepted.
+    '''
+    delta = current - previous
+
+    if delta < 0:
+        delta += modulus
+        if max_delta is None:
+            if modulus != COUNTER32_MODULUS:
+                return None
+        elif delta > max_delta:
+            return None
+    elif max_delta is not None and delta > max_delta:
+        return None
+
+    return delta
+
+
+class CiscoPyCounterRing(object):
+    '''
+    Columnar ring buffers of interface counter samples.
+
+    Every tracked interface is allocated a row. A row is a slice of
+    depth samples in each of the flat sample arrays. The head array
+    holds the position of the most recent sample of each row and the
+    count array the number of samples stored (up to depth).
+
+    Sample times are time.monotonic() seconds. A sample time of NaN
+    marks a missing sample, for example when a counter was not returned
+    by the device.
+
+    Every device is also allocated a device row, which holds the last
+    sysUpTime of the device and the sample time of the poll that found
+    the device reloaded (NaN when it has not).
+
+    Rows are allocated under a lock so that the rows of different devices
+    may be sampled from concurrent threads.
+    '''
+    def __init__(self, depth=120):
+        if depth < 2:
+            raise ValueError('depth must be at least 2 samples')
+
+        self.depth = depth
+        self.lock = threading.Lock()
+        self.rows = dict()
+        self.keys = list()
+        self.speed = array('d')
+        self.head = array('L')
+        self.count = array('L')
+        self.sample_time = array('d')
+        self.in_octets = array('Q')
+        self.out_octets = array('Q')
+        self.in_errors = array('Q')
+        self.row_device = array('L')
+        self.device_rows = dict()
+        self.device_uptime = array('d')
+        self.device_reload_time = array('d')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get_device_row(self, hostname):
+        '''Return the device row of hostname, allocated for a new
+        device.'''
+        try:
+            return self.device_rows[hostname]
+        except KeyError:
+            pass
+
+        with self.lock:
+            return self._get_device_row(hostname)
+
+    def _get_device_row(self, hostname):
+        # called with the lock held
+        if hostname not in self.device_rows:
+            self.device_uptime.append(NAN)
+            self.device_reload_time.append(NAN)
+            self.device_rows[hostname] = len(self.device_uptime) - 1
+
+        return self.device_rows[hostname]
+
+    def get_row(self, key):
+        '''
+        Return the row of the interface identified by key, a tuple of
+        (hostname, oid index). A row is allocated for a new interface.
+        '''
+        try:
+            return self.rows[key]
+        except KeyError:
+            pass
+
+        with self.lock:
+            # another thread may have allocated the row meanwhile
+            if key in self.rows:
+                return self.rows[key]
+
+            row = len(self.keys)
+            self.row_device.append(self._get_device_row(key[0]))
+            self.speed.append(0.0)
+            self.head.append(self.depth - 1)
+            self.count.append(0)
+            self.sample_time.extend([NAN] * self.depth)
+            self.in_octets.extend([0] * self.depth)
+            self.out_octets.extend([0] * self.depth)
+            self.in_errors.extend([0] * self.depth)
+            # the row is published once its columns are allocated
+            self.keys.append(key)
+            self.rows[key] = row
+
+        return row
+
+    def set_uptime(self, hostname, sample_time, uptime):
+        '''
+        Store the sysUpTime of a device, in hundredths of a second, polled
+        at sample_time. A sysUpTime lower than the last one stored means
+        the device reloaded, and its counters restarted, since the last
+        poll. An unknown (None) sysUpTime is ignored.
+        '''
+        if uptime is None:
+            return
+
+        device_row = self.get_device_row(hostname)
+
+        if uptime < self.device_uptime[device_row]:
+            self.device_reload_time[device_row] = sample_time
+
+        self.device_uptime[device_row] = uptime
+
+    def append(self, row, sample_time, in_octets, out_octets, in_errors):
+        '''
+        Store a sample in the ring buffer of row, overwriting the oldest
+        sample once the ring buffer is full. Any counter that is None
+        stores the sample as missing.
+        '''
+        head = (self.head[row] + 1) % self.depth
+        offset = row * self.depth + head
+        self.head[row] = head
+
+        if self.count[row] < self.depth:
+            self.count[row] += 1
+
+        if None in (in_octets, out_octets, in_errors):
+            self.sample_time[offset] = NAN
+            self.in_octets[offset] = 0
+            self.out_octets[offset] = 0
+            self.in_errors[offset] = 0
+        else:
+            self.sample_time[offset] = sample_time
+            self.in_octets[offset] = in_octets
+            self.out_octets[offset] = out_octets
+            self.in_errors[offset] = in_errors
+
+    def rates(self, tolerance=1.05):
+        '''
+        Compute the rates of every row from the two most recent samples
+        in a single pass over the columnar arrays.
+
+        Returns a dict of equal length columns:
+            keys:       (hostname, oid index) per row
+            interval:   seconds between the samples
+            in_bps:     input bits per second
+            out_bps:    output bits per second
+            in_eps:     input errors per second
+            in_util:    in_bps as a fraction of the interface speed
+            out_util:   out_bps as a fraction of the interface speed
+
+        A rate is NaN when there are fewer than two samples, either
+        sample is missing, or the counter was discontinuous. Every rate
+        of a row is NaN when the device reloaded between the samples, refer
+        to set_uptime, and the error rate is
+        NaN when either octet counter was discontinuous. The tolerance
+        allows for counters that slightly overrun the nominal interface
+        speed.
+        '''
+        depth = self.depth
+        heads = self.head
+        counts = self.count
+        speeds = self.speed
+        times = self.sample_time
+        ins = self.in_octets
+        outs = self.out_octets
+        errs = self.in_errors
+        row_devices = self.row_device
+        reload_times = self.device_reload_time
+        rows = len(self.keys)
+
+        interval = array('d', [NAN]) * rows
+        in_bps = array('d', [NAN]) * rows
+        out_bps = array('d', [NAN]) * rows
+        in_eps = array('d', [NAN]) * rows
+        in_util = array('d', [NAN]) * rows
+        out_util = array('d', [NAN]) * rows
+
+        for row in range(rows):
+            if counts[row] < 2:
+                continue
+
+            base = row * depth
+            cur = base + heads[row]
+            prev = base + (heads[row] - 1) % depth
+            elapsed = times[cur] - times[prev]
+
+            # NaN sample times compare False, so missing samples and
+            # non-increasing sample times are both skipped here
+            if not elapsed > 0:
+                continue
+
+            speed = speeds[row]
+            if speed > 0:
+                max_octets = speed * elapsed * tolerance / 8
+            else:
+                max_octets = UNKNOWN_SPEED_LIMIT * elapsed / 8
+
+            interval[row] = elapsed
+
+            # the counters of a reloaded device restart from zero, a NaN
+            # reload time compares False
+            if times[prev] < reload_times[row_devices[row]] <= times[cur]:
+                continue
+
+            in_delta = _counter_delta(ins[prev], ins[cur],
+                                      COUNTER64_MODULUS, max_octets)
+            if in_delta is not None:
+                in_bps[row] = in_delta * 8 / elapsed
+                if speed > 0:
+                    in_util[row] = in_bps[row] / speed
+
+            out_delta = _counter_delta(outs[prev], outs[cur],
+                                       COUNTER64_MODULUS, max_octets)
+            if out_delta is not None:
+                out_bps[row] = out_delta * 8 / elapsed
+                if speed > 0:
+                    out_util[row] = out_bps[row] / speed
+
+            # errors are bounded by the packet rate, which is not polled,
+            # so a decrease is only accepted as a Counter32 wrap when the
+            # octet counters of the interface were continuous
+            if in_delta is None or out_delta is None:
+                continue
+
+            delta = _counter_delta(errs[prev], errs[cur],
+                                   COUNTER32_MODULUS, None)
+            if delta is not None:
+                in_eps[row] = delta / elapsed
+
+        return {'keys': list(self.keys),
+                'interval': interval,
+                'in_bps': in_bps,
+                'out_bps': out_bps,
+                'in_eps': in_eps,
+                'in_util': in_util,
+                'out_util': out_util}
+
+
+class CiscoPyCounterPoller(object):
+    '''
+    Poll the interface counters of many devices on a schedule.
+
+    devices is a dict of hostname to SNMP community. ifindexes is an
+    optional dict of hostname to a set of oid indexes; when a hostname
+    is included only those interfaces are tracked, for example the
+    oid_index of the 'wan' role CiscoPyDevice.interface_records.
+
+    Interface speeds are walked on the first poll of a device and every
+    speed_refresh polls thereafter.
+    '''
+    def __init__(self, devices, interval=30, depth=120, max_workers=32,
+                 ifindexes=None, speed_refresh=120):
+        self.devices = devices
+        self.interval = interval
+        self.max_workers = max_workers
+        self.ifindexes = ifindexes or dict()
+        self.speed_refresh = speed_refresh
+        self.ring = CiscoPyCounterRing(depth=depth)
+        self.sessions = dict()
+        self.polls = dict()
+        self.statuscause = dict()
+
+    def _get_session(self, hostname):
+        if hostname not in self.sessions:
+            self.sessions[hostname] = CiscoPySNMP(hostname,
+                                                  self.devices[hostname])
+        return self.sessions[hostname]
+
+    def _set_speeds(self, hostname, cs):
+        ifspeeds = dict()
+
+        for v in cs.walk_ifspeed or []:
+            speed = _to_int(v.value)
+            if speed:
+                ifspeeds[v.oid_index] = float(speed)
+
+        # IF-MIB::ifSpeed saturates at 4294967295, ifHighSpeed is in
+        # units of 1,000,000 bits per second and takes precedence
+        for v in cs.walk_ifhighspeed or []:
+            speed = _to_int(v.value)
+            if speed:
+                ifspeeds[v.oid_index] = speed * 1000000.0
+
+        for oid_index, speed in ifspeeds.items():
+            key = (hostname, oid_index)
+            if key in self.ring.rows:
+                self.ring.speed[self.ring.rows[key]] = speed
+
+    def poll_device(self, hostname):
+        '''
+        Walk the counters of a single device and store a sample for
+        each tracked interface. Returns the number of interfaces
+        sampled.
+        '''
+        cs = self._get_session(hostname)
+        cs.get_counterdata
+
+        if cs.ifHCInOctets is None:
+            self.statuscause[hostname] = 'no ifHCInOctets'
+            return 0
+
+        # the midpoint of the ifHCInOctets walk, so the duration of the
+        # other walks does not add jitter to the sample interval
+        sample_time = cs.ifHCInOctetsTime
+        self.ring.set_uptime(hostname, sample_time,
+                             _to_timeticks(getattr(cs.sysUpTime, 'value',
+                                                   None)))
+
+        wanted = self.ifindexes.get(hostname)
+        outs = dict((v.oid_index, _to_int(v.value))
+                    for v in cs.ifHCOutOctets or [])
+        errs = dict((v.oid_index, _to_int(v.value))
+                    for v in cs.ifInErrors or [])
+        new_rows = False
+        sampled = 0
+
+        for v in cs.ifHCInOctets:
+            if wanted is not None and v.oid_index not in wanted:
+                continue
+
+            key = (hostname, v.oid_index)
+            new_rows = new_rows or key not in self.ring.rows
+            row = self.ring.get_row(key)
+            self.ring.append(row, sample_time, _to_int(v.value),
+                             outs.get(v.oid_index), errs.get(v.oid_index))
+            sampled += 1
+
+        polls = self.polls.get(hostname, 0)
+        if new_rows or polls % self.speed_refresh == 0:
+            self._set_speeds(hostname, cs)
+
+        self.polls[hostname] = polls + 1
+        self.statuscause.pop(hostname, None)
+
+        return sampled
+
+    def poll(self):
+        '''
+        Poll every device once, max_workers devices at a time. Returns
+        the total number of interfaces sampled.
+        '''
+        def poll_device(hostname):
+            try:
+                return self.poll_device(hostname)
+            except Exception as exception:
+                self.statuscause[hostname] = str(exception)
+                return 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return sum(executor.map(poll_device, list(self.devices)))
+
+    def rates(self, tolerance=1.05):
+        '''Return the rates of every tracked interface, refer to
+        CiscoPyCounterRing.rates.'''
+        return self.ring.rates(tolerance=tolerance)
+
+    def run(self, cycles=None, callback=None):
+        '''
+        Poll every interval seconds, for cycles polls or forever when
+        cycles is None. When a poll overruns the interval the missed
+        polls are skipped rather than run back to back.
+
+        callback, when set, is called with the result of rates() after
+        each poll.
+        '''
+        cycle = 0
+        next_poll = time.monotonic()
+
+        while cycles is None or cycle < cycles:
+            self.poll()
+            cycle += 1
+
+            if callback is not None:
+                callback(self.rates())
+
+            if cycles is not None and cycle >= cycles:
+                break
+
+            next_poll += self.interval
+            now = time.monotonic()
+            if next_poll < now:
+                next_poll += ((now - next_poll) // self.interval + 1) * self.interval
+
+            time.sleep(next_poll - now)
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+'''
+The purpose of this module is to provide opt in profiling of the
+CiscoPyConfAsList query methods and the CiscoPySNMP get and walk
+methods.
+
+Profiling is disabled by default. When disabled, a profiled method only
+checks the profiler enabled attribute before calling the method.
+
+    from ciscopy.ciscopyprofile import profiler
+    profiler.enable()
+    ... run audit rules, SNMP polls ...
+    print(profiler.report(10))
+
+Statistics are kept per (category, method, pattern) where the category is
+'conf' or 'snmp' and the pattern is the regular expression, string or OID
+the method was called with. Each entry records:
+    calls:          number of calls
+    elapsed:        total elapsed seconds, for snmp the round trip
+                    latency of the get or walk
+    lines:          configuration lines scanned (conf)
+    regex_evals:    evaluations of the regular expressions the method was
+                    called with, counted by the patterns returned by
+                    compile_rx (conf)
+    result_size:    total length of the results (conf: lines or sections,
+                    snmp: varbinds)
+    errors:         calls that raised an exception
+
+A callback, set with enable, is called with a dict of every single call
+record, for example to feed a metrics pipeline.
+
+The profiled methods compile their regular expressions with compile_rx.
+While profiling is enabled, compile_rx returns a pattern that counts its
+evaluations. When disabled, it returns the compiled regular expression.
+'''
+
+import functools
+import re
+import threading
+import time
+
+_STAT_FIELDS = ('calls', 'elapsed', 'lines', 'regex_evals', 'result_size',
+                'errors')
+
+
+class CiscoPyProfiler(object):
+    def __init__(self):
+        self.enabled = False
+        self.callback = None
+        self.stats = dict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self, callback=None):
+        self.callback = callback
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.stats = dict()
+
+    def record(self, category, method, pattern, elapsed, lines=0,
+               regex_evals=0, result_size=0, error=False):
+        key = (category, method, pattern)
+
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = dict.fromkeys(_STAT_FIELDS, 0)
+            stats['calls'] += 1
+            stats['elapsed'] += elapsed
+            stats['lines'] += lines
+            stats['regex_evals'] += regex_evals
+            stats['result_size'] += result_size
+            stats['errors'] += int(error)
+
+        if self.callback is not None:
+            self.callback({'category': category,
+                           'method': method,
+                           'pattern': pattern,
+                           'elapsed': elapsed,
+                           'lines': lines,
+                           'regex_evals': regex_evals,
+                           'result_size': result_size,
+                           'error': error})
+
+    def top(self, n=10, sort='elapsed', category=None):
+        '''Return a list of the n (category, method, pattern), stats dict
+        tuples with the largest sort statistic.'''
+        with self._lock:
+            items = [(k, dict(v)) for k, v in self.stats.items()
+                     if category is None or k[0] == category]
+
+        items.sort(key=lambda kv: kv[1][sort], reverse=True)
+
+        return items[:n]
+
+    def report(self, n=10, sort='elapsed', category=None):
+        '''Return the top n statistics as a str table.'''
+        rl = ['{:<5} {:<22} {:<40} {:>8} {:>10} {:>10} {:>10} {:>8}'.format(
+            'cat', 'method', 'pattern', 'calls', 'elapsed', 'lines',
+            'regex', 'results')]
+
+        for (cat, method, pattern), stats in self.top(n, sort, category):
+            rl.append(
+                '{:<5} {:<22} {:<40} {:>8} {:>10.4f} {:>10} {:>10} {:>8}'.format(
+                    cat, method, str(pattern)[:40], stats['calls'],
+                    stats['elapsed'], stats['lines'], stats['regex_evals'],
+                    stats['result_size']))
+
+        return '\n'.join(rl)
+
+    def __repr__(self):
+        return '{}(enabled={}, {} entries)'.format(self.__class__.__name__,
+                                                  self.enabled,
+                                                  len(self.stats))
+
+
+profiler = CiscoPyProfiler()
+
+
+def _record(*args, **kwargs):
+    # A failure to record, for example in the callback, must not replace
+    # the result or the exception of the profiled call
+    try:
+        profiler.record(*args, **kwargs)
+    except Exception:
+        pass
+
+
+def _oid_pattern(oids):
+    # easysnmp accepts an OID str, an (OID, index) tuple, whose index may
+    # be an int, or a list of either
+    if isinstance(oids, tuple):
+        return '.'.join(map(str, oids))
+    if isinstance(oids, list):
+        return ', '.join(map(_oid_pattern, oids))
+    return str(oids)
+
+
+def _result_size(result):
+    try:
+        return len(result)
+    except TypeError:
+        return int(result is not None)
+
+
+class CiscoPyCountingPattern(object):
+    '''A compiled regular expression that counts its evaluations.'''
+    __slots__ = ('crx', 'count')
+
+    def __init__(self, crx):
+        self.crx = crx
+        self.count = 0
+
+    def search(self, *args):
+        self.count += 1
+        return self.crx.search(*args)
+
+    def match(self, *args):
+        self.count += 1
+        return self.crx.match(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.crx, name)
+
+    def __repr__(self):
+        return '{}({!r}, count={})'.format(self.__class__.__name__,
+                                          self.crx.pattern, self.count)
+
+
+def compile_rx(rx):
+    '''
+    Return the regular expression rx compiled. Within a profiled call the
+    pattern counts its evaluations, which are recorded as the regex_evals
+    of the call.
+    '''
+    crx = re.compile(rx)
+
+    if not profiler.enabled:
+        return crx
+
+    patterns = getattr(profiler._local, 'patterns', None)
+    if patterns is None:
+        return crx
+
+    pattern = CiscoPyCountingPattern(crx)
+    patterns.append(pattern)
+
+    return pattern
+
+
+def profiled():
+    '''
+    Decorate a CiscoPyConfAsList query method.
+
+    Only the outermost profiled call is recorded, a profiled method that
+    calls another profiled method is recorded once.
+    '''
+    def decorator(method):
+        name = method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not profiler.enabled or getattr(profiler._local, 'active',
+                                               False):
+                return method(self, *args, **kwargs)
+
+            profiler._local.active = True
+            profiler._local.patterns = patterns = []
+            lines = len(self)
+            error = False
+            result = None
+            start = time.perf_counter()
+
+            try:
+                result = method(self, *args, **kwargs)
+                return result
+            except Exception:
+                error = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                profiler._local.active = False
+                profiler._local.patterns = None
+                _record('conf', name, args[0] if args else None,
+                                elapsed, lines=lines,
+                                regex_evals=sum(p.count for p in patterns),
+                                result_size=_result_size(result),
+                                error=error)
+
+        return wrapper
+    return decorator
+
+
+def profiled_snmp(method):
+    '''Decorate a CiscoPySNMP get or walk method, whose first argument is
+    the oids.'''
+    name = method.__name__
+    default_oids = (method.__defaults__ or (None,))[0]
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not profiler.enabled:
+            return method(self, *args, **kwargs)
+
+        oids = args[0] if args else kwargs.get('oids', default_oids)
+        start = time.perf_counter()
+
+        try:
+            result = method(self, *args, **kwargs)
+        except Exception:
+            _record('snmp', name, _oid_pattern(oids),
+                    time.perf_counter() - start, error=True)
+            raise
+
+        _record('snmp', name, _oid_pattern(oids),
+                time.perf_counter() - start,
+                result_size=_result_size(result))
+
+        return result
+
+    return wrapper
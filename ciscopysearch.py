@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+'''
+The purpose of this module is to provide a search of an entire corpus of
+configurations, for example the running-configs of every device in the
+fleet, using a pool of processes.
+
+The queries are equivalent to the CiscoPyConfAsList methods:
+    *   include:        CiscoPyConfAsList.include
+    *   section:        CiscoPyConfAsList.sections
+    *   interfaceswith: CiscoPyConfAsList.get_interfaceswith
+
+Before a regular expression is evaluated, the longest literal substring
+that every match must contain is looked for with the 'in' operator. A
+configuration, or a line, that does not contain the literal substring
+can not match and is skipped.
+'''
+
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ciscopy.ciscopyconf import CiscoPyConf, CiscoPyConfAsList
+
+
+def literal_prefilter(rx):
+    r'''
+    Return the longest literal substring that every match of the regular
+    expression rx must contain, or '' when there is none that can be
+    safely determined (alternation, inline flags, etc.).
+
+    The parse is conservative: only literals outside of groups and
+    character classes are considered, and a literal character followed by
+    an optional quantifier (*, ? or {) is dropped. A pattern with an
+    escape that takes an argument (\x20, \u0020, \N{...}, octal or a
+    group reference) has no literal substring.
+
+    Every line that matches rx contains the literal substring:
+
+    >>> literal_prefilter(r'^ ip address \d')
+    ' ip address '
+    >>> literal_prefilter(r'ip\x20address')
+    ''
+    >>> literal_prefilter(r'\012 ip') + literal_prefilter(r'(a)\1 ip')
+    ''
+    >>> literal_prefilter(r'neighbor \S+ remote-as 6500\d?')
+    ' remote-as 6500'
+    '''
+    if '|' in rx or '(?' in rx:
+        return ''
+
+    runs = list()
+    run = ''
+    depth = 0
+    i = 0
+
+    while i < len(rx):
+        c = rx[i]
+        i += 1
+
+        if c == '\\':
+            escaped = rx[i:i + 1]
+            i += 1
+            # the argument of the escape is not literal text
+            if escaped in ('x', 'u', 'U', 'N') or escaped.isdigit():
+                return ''
+            if depth == 0 and escaped and not escaped.isalnum():
+                run += escaped
+            else:
+                runs.append(run)
+                run = ''
+        elif c == '[':
+            runs.append(run)
+            run = ''
+            # skip the character class, a ] straight after [ or [^ is a
+            # literal ]
+            if rx[i:i + 1] == '^':
+                i += 1
+            if rx[i:i + 1] == ']':
+                i += 1
+            while i < len(rx) and rx[i] != ']':
+                i += 2 if rx[i] == '\\' else 1
+            i += 1
+        elif c == '(':
+            runs.append(run)
+            run = ''
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c in '*?{':
+            # the preceding character is optional
+            runs.append(run[:-1])
+            run = ''
+            if c == '{':
+                i = rx.find('}', i) + 1 or len(rx)
+        elif c in '+.^$':
+            runs.append(run)
+            run = ''
+        elif depth == 0:
+            run += c
+
+    runs.append(run)
+
+    return max(runs, key=len)
+
+
+def _load(config):
+    if isinstance(config, str):
+        cc = CiscoPyConf()
+        cc.get_cfgfromfile(config)
+        return cc
+    return config
+
+
+def _include(lines, rx, literal):
+    return [(i + 1, v) for i, v in enumerate(lines)
+            if literal in v and rx.search(v)]
+
+
+def _section(lines, rx, literal):
+    results = list()
+    lines = CiscoPyConfAsList(lines)
+    next_index = 0
+
+    for i, v in enumerate(lines):
+        if i < next_index or literal not in v or not rx.search(v):
+            continue
+        section = lines._sub_section(i)
+        results.append((i + 1, section))
+        # nested matches are part of the section already yielded
+        next_index = i + len(section)
+
+    return results
+
+
+def _interfaceswith(lines, rx, literal):
+    results = list()
+    interface_index = None
+    interface_with = None
+
+    for i, v in enumerate(list(lines) + ['']):
+        if v.startswith('interface') or not v[:1].isspace():
+            if interface_with and len(interface_with) > 1:
+                interface_with.append(' exit')
+                results.append((interface_index + 1, interface_with))
+            interface_with = None
+
+            if v.startswith('interface'):
+                interface_index = i
+                interface_with = CiscoPyConfAsList([v])
+                if literal in v and rx.search(v):
+                    interface_with.append(v)
+        elif interface_with is not None and literal in v and rx.search(v):
+            interface_with.append(v)
+
+    return results
+
+
+_QUERIES = {'include': _include,
+            'section': _section,
+            'interfaceswith': _interfaceswith}
+
+
+def _search(query, rx, literal, items):
+    '''Search a batch of (hostname, config) items, in a worker process.'''
+    results = list()
+    crx = re.compile(rx)
+    func = _QUERIES[query]
+
+    for hostname, config in items:
+        lines = _load(config)
+
+        if literal and literal not in '\n'.join(lines):
+            continue
+
+        for lineno, match in func(lines, crx, literal):
+            results.append((hostname, lineno, match))
+
+    return results
+
+
+class CiscoPyConfCorpus(object):
+    '''
+    A corpus of configurations. configs is a dict of hostname to a
+    CiscoPyConfAsList, or to the path of a file containing the
+    configuration, which is loaded by the worker process using
+    CiscoPyConf.get_cfgfromfile. Passing paths avoids sending every
+    configuration to the worker processes.
+
+    processes is the number of worker processes, None for one per cpu,
+    or 0 to search in the calling process. Configurations are sent to
+    the workers in batches of batch_size.
+    '''
+    def __init__(self, configs, processes=None, batch_size=64):
+        self.configs = configs
+        self.processes = processes
+        self.batch_size = batch_size
+
+    def search(self, query, rx):
+        '''
+        Yield (hostname, line number, match) for every match of rx in the
+        corpus. query is one of 'include', 'section' or
+        'interfaceswith'. The match is the matched line for include, and
+        a CiscoPyConfAsList for section and interfaceswith. Line numbers
+        start at 1.
+
+        Results of one configuration are yielded together, the order of
+        configurations is the order in which the workers finish.
+        '''
+        if query not in _QUERIES:
+            raise ValueError('unknown query: {}'.format(query))
+
+        literal = literal_prefilter(rx)
+        items = list(self.configs.items())
+        batches = [items[i:i + self.batch_size]
+                   for i in range(0, len(items), self.batch_size)]
+
+        if self.processes == 0:
+            for batch in batches:
+                for result in _search(query, rx, literal, batch):
+                    yield result
+            return
+
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            futures = [executor.submit(_search, query, rx, literal, batch)
+                       for batch in batches]
+            for future in as_completed(futures):
+                for result in future.result():
+                    yield result
+
+    def include(self, rx):
+        '''Yield the lines of every configuration that match rx.'''
+        return self.search('include', rx)
+
+    i = include
+
+    def section(self, rx):
+        '''Yield the sections of every configuration whose first line
+        matches rx.'''
+        return self.search('section', rx)
+
+    s = section
+
+    def interfaceswith(self, rx):
+        '''Yield the interfaces of every configuration with lines that
+        match rx, as per CiscoPyConfAsList.get_interfaceswith.'''
+        return self.search('interfaceswith', rx)
+
+    def __repr__(self):
+        return '{}({} configs)'.format(self.__class__.__name__,
+                                       len(self.configs))
@@ -14,7 +14,9 @@ The Cisco IOS type devices MUST support the following MIBs:
     *   ENTITY-MIB
 '''
 
+import time
 import easysnmp
+from ciscopy.ciscopyprofile import profiled_snmp
 
 class CiscoPySNMP(easysnmp.session.Session):
     def __init__(self, hostname, community):
@@ -22,6 +24,14 @@ class CiscoPySNMP(easysnmp.session.Session):
                          version=2, timeout=3, retries=2,
                          use_sprint_value=True)
 
+    @profiled_snmp
+    def get(self, oids):
+        return super().get(oids)
+
+    @profiled_snmp
+    def walk(self, oids='.1.3.6.1.2.1'):
+        return super().walk(oids)
+
     def get_ifindex(self, interface):
         r = None
         
@@ -73,6 +83,16 @@ class CiscoPySNMP(easysnmp.session.Session):
         except:
             return None
     
+    @property
+    def get_sysuptime(self):
+        '''snmp get .1.3.6.1.2.1.1.3
+        .1.3.6.1.2.1.1.3 = SNMPv2-MIB::sysUpTime.0'''
+        
+        try:
+            return self.get(('.1.3.6.1.2.1.1.3', '0'))
+        except:
+            return None
+    
     @property
     def walk_ipadentifindex(self):
         '''snmp walk .1.3.6.1.2.1.4.20.1.2
@@ -137,6 +157,42 @@ class CiscoPySNMP(easysnmp.session.Session):
         except:
             return None
     
+    @property
+    def walk_ifhighspeed(self):
+        '''snmp walk .1.3.6.1.2.1.31.1.1.1.15
+        .1.3.6.1.2.1.31.1.1.1.15 = IF-MIB::ifHighSpeed'''
+        try:
+            return self.walk('.1.3.6.1.2.1.31.1.1.1.15')
+        except:
+            return None
+    
+    @property
+    def walk_ifhcinoctets(self):
+        '''snmp walk .1.3.6.1.2.1.31.1.1.1.6
+        .1.3.6.1.2.1.31.1.1.1.6 = IF-MIB::ifHCInOctets'''
+        try:
+            return self.walk('.1.3.6.1.2.1.31.1.1.1.6')
+        except:
+            return None
+    
+    @property
+    def walk_ifhcoutoctets(self):
+        '''snmp walk .1.3.6.1.2.1.31.1.1.1.10
+        .1.3.6.1.2.1.31.1.1.1.10 = IF-MIB::ifHCOutOctets'''
+        try:
+            return self.walk('.1.3.6.1.2.1.31.1.1.1.10')
+        except:
+            return None
+    
+    @property
+    def walk_ifinerrors(self):
+        '''snmp walk .1.3.6.1.2.1.2.2.1.14
+        .1.3.6.1.2.1.2.2.1.14 = IF-MIB::ifInErrors'''
+        try:
+            return self.walk('.1.3.6.1.2.1.2.2.1.14')
+        except:
+            return None
+    
     @property
     def walk_entphysicalmfgname(self):
         '''snmp walk .1.3.6.1.2.1.47.1.1.1.1.12
@@ -181,5 +237,20 @@ class CiscoPySNMP(easysnmp.session.Session):
         self.entPhysicalSerialNum = self.walk_entphysicalserialnum
         self.entPhysicalModelName = self.walk_entphysicalmodelname
     
+    @property
+    def get_counterdata(self):
+        '''Use the individual get and walk methods to define the
+        attributes that store the interface counters polled by
+        CiscoPyCounterPoller.
+
+        ifHCInOctetsTime is the time.monotonic() midpoint of the
+        ifHCInOctets walk, the time of the counter samples.'''
+        self.sysUpTime = self.get_sysuptime
+        start = time.monotonic()
+        self.ifHCInOctets = self.walk_ifhcinoctets
+        self.ifHCInOctetsTime = (start + time.monotonic()) / 2
+        self.ifHCOutOctets = self.walk_ifhcoutoctets
+        self.ifInErrors = self.walk_ifinerrors
+    
     def __repr__(self):
         return '{}({})'.format(self.__class__.__name__, self.__dict__)